@@ -0,0 +1,253 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import contextlib
+import json
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+from cache import run_in_store_thread
+from config import BATCH_MAX_ITEMS, BATCH_MAX_WORKERS, REQUEST_BUDGET, SEARCH_MAX_RESULTS
+from digest import assemble_digest, generation_section, generation_stage
+from fmp import CompanyNotFound, close_async_client, fetch_company_async, prefetch_batch, search_symbol_async, symbol_index
+from llm import as_ready_async, generate_async, generate_comments_async, note_statement_period, submit_async
+from policy import UpstreamUnavailable, request_budget, submit as submit_in_context
+from singleflight import AsyncSingleFlight
+from telemetry import current_request_id, new_request_id, register_stats, render as render_metrics, request_scope, stage, timed
+
+# Async serving mode: the same routes as app.py, but FMP and Gemini calls are awaited
+# instead of holding a worker thread, so one process can carry hundreds of digests.
+# Production launch: gunicorn -c gunicorn.conf.py (see that file).
+
+# In-flight /analyze work keyed by normalized query and by resolved symbol, and the
+# company fetch of every digest (streams included) keyed by symbol
+coalescer = AsyncSingleFlight()
+# Tickers built at once for /analyze/batch across all batches, and a thread for each
+# batch's blocking warm-up (multi-symbol profile calls and peer index builds)
+batch_slots = asyncio.Semaphore(BATCH_MAX_WORKERS)
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS, thread_name_prefix="batch")
+register_stats("singleflight_calls_total", "Calls that led an upstream fetch or joined one in flight.", "flight", "analyze_async", coalescer.stats)
+
+
+async def home(request):
+    return JSONResponse({"message": "✅ FMP-based Financial Digest AI backend is running!"})
+
+
+async def search(request):
+    # Same as app.search(); an in-memory lookup, so it runs on the event loop
+    query = request.query_params.get('q', '').strip()
+    try:
+        limit = max(1, min(int(request.query_params.get('limit', SEARCH_MAX_RESULTS)), SEARCH_MAX_RESULTS))
+    except ValueError:
+        limit = SEARCH_MAX_RESULTS
+    return JSONResponse({"query": query, "results": symbol_index.search(query, limit)})
+
+
+async def digest_sections(company_name, symbol):
+    # Async counterpart of app.digest_sections()
+    # Steps 2-5: profile, income statement, cash flow and industry peers, fetched concurrently;
+    # concurrent digests of one symbol (streams included) share the fetch
+    profile, income_data, cashflow_data, industry_peers = await coalescer.do(("fetch", symbol), lambda: fetch_company_async(symbol))
+    # A new period invalidates cached generations, a scan of the SQLite tier when one is set
+    await run_in_store_thread(note_statement_period, symbol, income_data[0].get("date") if income_data else None)
+
+    # Steps 6-10: numeric sections and the Gemini prompts
+    with stage("assemble"):
+        financial_data, prompts = assemble_digest(company_name, symbol, profile, income_data, cashflow_data, industry_peers)
+    if "error" in financial_data:
+        yield financial_data
+        return
+
+    generations = {
+        name: submit_async(timed(generation_stage(name), generate_comments_async if name == "Comment" else generate_async), prompt, symbol)
+        for name, prompt in prompts.items()
+    }
+    yield financial_data
+    comments = {}
+    async for name, result in as_ready_async(generations):
+        section, comments = generation_section(name, result, comments)
+        if section:
+            yield section
+
+
+async def build_digest(company_name, symbol):
+    financial_data = {}
+    async for section in digest_sections(company_name, symbol):
+        if "error" in section:
+            return section, 500
+        financial_data.update(section)
+    return financial_data, 200
+
+
+async def resolve_and_build(company_name):
+    # Step 1: Search ticker
+    symbol = await search_symbol_async(company_name)
+    if not symbol:
+        return {"error": "Company not found in FMP"}, 404
+    return await coalescer.do(("symbol", symbol), lambda: build_digest(company_name, symbol))
+
+
+async def company_from(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        return ""
+    return (data.get('company') or '').strip() if isinstance(data, dict) else ""
+
+
+async def metrics(request):
+    # Same as app.metrics()
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+async def run_digest(company_name, symbol=None, endpoint="analyze", request_id=None):
+    # Same as app.run_digest()
+    with request_scope(endpoint, request_id or new_request_id()) as scope:
+        payload, scope["status"] = await digest_or_error(company_name, symbol)
+    return payload, scope["status"]
+
+
+async def digest_or_error(company_name, symbol):
+    try:
+        with request_budget(REQUEST_BUDGET):
+            if symbol:
+                return await coalescer.do(("symbol", symbol), lambda: build_digest(company_name, symbol))
+            return await coalescer.do(("query", company_name.lower()), lambda: resolve_and_build(company_name))
+    except CompanyNotFound:
+        return {"error": "Company not found in FMP"}, 404
+    except UpstreamUnavailable as e:
+        print(f"Upstream Error [{current_request_id()}]:", e)
+        return {"error": "Financial data is temporarily unavailable, please try again shortly"}, 503
+    except Exception as e:
+        print(f"Critical Error [{current_request_id()}]:", e)
+        return {"error": "Server error occurred"}, 500
+
+
+async def analyze(request):
+    company_name = await company_from(request)
+
+    if not company_name:
+        return JSONResponse({"error": "Company name is required"}, status_code=400)
+
+    request_id = new_request_id(request.headers.get("X-Request-ID"))
+    payload, status = await run_digest(company_name, request_id=request_id)
+    return JSONResponse(payload, status_code=status, headers={"X-Request-ID": request_id})
+
+
+async def analyze_stream(request):
+    # Same NDJSON protocol as app.analyze_stream()
+    company_name = await company_from(request)
+
+    if not company_name:
+        return JSONResponse({"error": "Company name is required"}, status_code=400)
+
+    request_id = new_request_id(request.headers.get("X-Request-ID"))
+
+    async def stream():
+        with request_scope("analyze_stream", request_id) as scope:
+            try:
+                with request_budget(REQUEST_BUDGET):
+                    symbol = await search_symbol_async(company_name)
+                    if not symbol:
+                        scope["status"] = 404
+                        yield json.dumps({"error": "Company not found in FMP"}) + "\n"
+                        return
+                    async for section in digest_sections(company_name, symbol):
+                        yield json.dumps(section) + "\n"
+            except CompanyNotFound:
+                scope["status"] = 404
+                yield json.dumps({"error": "Company not found in FMP"}) + "\n"
+            except UpstreamUnavailable as e:
+                print(f"Upstream Error [{request_id}]:", e)
+                scope["status"] = 503
+                yield json.dumps({"error": "Financial data is temporarily unavailable, please try again shortly"}) + "\n"
+            except Exception as e:
+                print(f"Critical Error [{request_id}]:", e)
+                scope["status"] = 500
+                yield json.dumps({"error": "Server error occurred"}) + "\n"
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Request-ID": request_id}
+    return StreamingResponse(stream(), media_type="application/x-ndjson", headers=headers)
+
+
+async def analyze_batch(request):
+    # Same NDJSON protocol as app.analyze_batch()
+    try:
+        data = await request.json()
+    except ValueError:
+        data = {}
+    data = data if isinstance(data, dict) else {}
+    companies = list(dict.fromkeys(c.strip() for c in data.get('companies', []) if isinstance(c, str) and c.strip()))
+    symbols = list(dict.fromkeys(s.strip().upper() for s in data.get('symbols', []) if isinstance(s, str) and s.strip()))
+
+    if not companies and not symbols:
+        return JSONResponse({"error": "At least one company or symbol is required"}, status_code=400)
+    if len(companies) + len(symbols) > BATCH_MAX_ITEMS:
+        return JSONResponse({"error": f"A batch can contain at most {BATCH_MAX_ITEMS} companies"}, status_code=400)
+
+    # Every ticker is traced as its own request, "<batch id>-<symbol>"
+    request_id = new_request_id(request.headers.get("X-Request-ID"))
+
+    async def build(query, symbol):
+        async with batch_slots:
+            payload, status = await run_digest(query, symbol, "analyze_batch", f"{request_id}-{symbol}")
+        return query, symbol, payload, status
+
+    async def stream():
+        # Setup (name lookups and warm-up) is traced as the batch ID itself and shares one
+        # budget; unknown names are reported straight away
+        resolved = {symbol: symbol for symbol in symbols}
+        with request_scope("analyze_batch_setup", request_id), request_budget(REQUEST_BUDGET):
+            lookups = {company: asyncio.ensure_future(search_symbol_async(company)) for company in companies}
+            for company, lookup in lookups.items():
+                try:
+                    symbol = await lookup
+                except UpstreamUnavailable as e:
+                    print(f"Upstream Error [{request_id}]:", e)
+                    yield json.dumps({"query": company, "status": 503, "result": {"error": "Financial data is temporarily unavailable, please try again shortly"}}) + "\n"
+                    continue
+                except Exception as e:
+                    print("Batch Search Error:", e)
+                    yield json.dumps({"query": company, "status": 500, "result": {"error": "Server error occurred"}}) + "\n"
+                    continue
+                if not symbol:
+                    yield json.dumps({"query": company, "status": 404, "result": {"error": "Company not found in FMP"}}) + "\n"
+                else:
+                    resolved.setdefault(company, symbol)
+
+            # The warm-up blocks on FMP calls, so it runs on a batch thread
+            await asyncio.wrap_future(submit_in_context(batch_executor, prefetch_batch, list(dict.fromkeys(resolved.values()))))
+
+        jobs = [asyncio.ensure_future(build(query, symbol)) for query, symbol in resolved.items()]
+        try:
+            for job in asyncio.as_completed(jobs):
+                query, symbol, payload, status = await job
+                yield json.dumps({"query": query, "symbol": symbol, "status": status, "result": payload}) + "\n"
+        finally:
+            # The client went away: stop building the tickers nobody will read
+            for job in jobs:
+                job.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson", headers={"X-Request-ID": request_id})
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    yield
+    await close_async_client()
+
+
+app = Starlette(
+    routes=[
+        Route('/', home),
+        Route('/search', search),
+        Route('/metrics', metrics),
+        Route('/analyze', analyze, methods=['POST']),
+        Route('/analyze/stream', analyze_stream, methods=['POST']),
+        Route('/analyze/batch', analyze_batch, methods=['POST']),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])],
+    lifespan=lifespan,
+)
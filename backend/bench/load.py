@@ -0,0 +1,289 @@
+import argparse
+import itertools
+import json
+import logging
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import requests
+
+from bench import stubs
+
+# Load driver for the digest endpoints, run against the local FMP and Gemini stubs:
+#
+#     cd backend && python -m bench.load --server flask --concurrency 1,4,16 --requests 64
+#     cd backend && python -m bench.load --server asgi --mode stream --workload unique
+#
+# By default it starts both stubs and the app in this process, pointed at the stubs, and
+# reports per concurrency level: latency percentiles, throughput, errors and how many
+# FMP and Gemini calls each request cost. With --url it drives an app that is already
+# running (started with FMP_BASE_URL and GEMINI_API_ENDPOINT set to `python -m
+# bench.stubs`); pass --fmp-stub/--gemini-stub to still count upstream calls.
+#
+# Workloads: "repeat" cycles through the fixture companies, so after the warm-up every
+# request is served from caches, stores and indexes; "unique" asks for a new synthetic
+# ticker every time, so every request pays for its FMP fetches and Gemini prompts.
+#
+# Save a run with --json and compare a later one with --baseline; the exit status is 1
+# when p95 latency, throughput or upstream calls per request regress by more than
+# --tolerance.
+
+STUB_API_KEY = "bench"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def configure_app(fmp_url, gemini_url, workdir):
+    # Must run before the app is imported: config reads the environment once. Rate limits
+    # are lifted unless set, so a run measures the pipeline rather than the token buckets.
+    os.environ.update({
+        "FMP_BASE_URL": fmp_url + "/api/v3",
+        "GEMINI_API_ENDPOINT": gemini_url,
+        "FMP_API_KEY": STUB_API_KEY,
+        "GEMINI_API_KEY": STUB_API_KEY,
+        "STATEMENT_DB_PATH": os.path.join(workdir, "statements.db"),
+        "SYMBOL_INDEX_PATH": os.path.join(workdir, "symbols.json"),
+        "CACHE_DB_PATH": "",
+    })
+    for name, value in (("FMP_RATE_LIMIT", "1000"), ("FMP_RATE_BURST", "1000"), ("GEMINI_RATE_LIMIT", "1000"), ("GEMINI_RATE_BURST", "1000")):
+        os.environ.setdefault(name, value)
+
+
+def start_app(server):
+    # The app on a free local port, served from a background thread; returns its URL
+    port = free_port()
+    if server == "flask":
+        from werkzeug.serving import make_server
+        import app
+
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)  # no access log per request
+        httpd = make_server("127.0.0.1", port, app.app, threaded=True)
+        threading.Thread(target=httpd.serve_forever, name="bench-flask", daemon=True).start()
+    else:
+        import uvicorn
+        import asgi
+
+        uvicorn_server = uvicorn.Server(uvicorn.Config(asgi.app, host="127.0.0.1", port=port, log_level="warning"))
+        threading.Thread(target=uvicorn_server.run, name="bench-uvicorn", daemon=True).start()
+        while not uvicorn_server.started:
+            time.sleep(0.01)
+
+    from fmp import symbol_index
+
+    deadline = time.monotonic() + 30
+    while not symbol_index.ready() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    if not symbol_index.ready():
+        sys.exit("Symbol index did not load from the FMP stub")
+    return f"http://127.0.0.1:{port}"
+
+
+class Upstreams:
+    # Call counts from in-process stubs or from running ones over /_stats
+    def __init__(self, fmp=None, gemini=None):
+        self.sources = {"fmp": fmp, "gemini": gemini}
+
+    def snapshot(self):
+        counts = {}
+        for name, source in self.sources.items():
+            if source is None:
+                continue
+            if isinstance(source, str):
+                stats = requests.get(source.rstrip("/") + "/_stats", timeout=5).json()
+            else:
+                stats = source.stats()
+            counts[name] = stats["calls"]
+        return counts
+
+    @staticmethod
+    def delta(before, after):
+        return {
+            name: {endpoint: n - before[name].get(endpoint, 0) for endpoint, n in calls.items() if n - before[name].get(endpoint, 0)}
+            for name, calls in after.items()
+        }
+
+
+def workload_queries(workload, synthetic):
+    if workload == "repeat":
+        return itertools.cycle(stubs.FMPData(stubs.load_fixture("fmp.json")).templates)
+    return (stubs.synthetic_symbol(n) for n in range(1, synthetic + 1))
+
+
+def send(session, url, mode, queries):
+    # One request; returns (seconds, seconds to the first line or None, ok)
+    started = time.perf_counter()
+    if mode == "analyze":
+        response = session.post(f"{url}/analyze", json={"company": queries[0]}, timeout=120)
+        return time.perf_counter() - started, None, response.status_code == 200 and "error" not in response.json()
+
+    path, body = ("/analyze/stream", {"company": queries[0]}) if mode == "stream" else ("/analyze/batch", {"symbols": queries})
+    first_line = None
+    ok = True
+    with session.post(url + path, json=body, timeout=120, stream=True) as response:
+        ok = response.status_code == 200
+        for line in response.iter_lines():
+            if not line:
+                continue
+            if first_line is None:
+                first_line = time.perf_counter() - started
+            item = json.loads(line)
+            if "error" in item or item.get("status", 200) != 200:
+                ok = False
+    return time.perf_counter() - started, first_line, ok
+
+
+def run_level(url, mode, queries, lock, concurrency, count, batch_size):
+    # Closed loop: each worker sends its next request as soon as the previous one returns
+    results = []
+    remaining = itertools.count()
+
+    def worker():
+        session = requests.Session()
+        while next(remaining) < count:
+            with lock:
+                batch = [next(queries) for _ in range(batch_size if mode == "batch" else 1)]
+            try:
+                results.append(send(session, url, mode, batch))
+            except Exception as e:
+                print("Load Request Error:", e)
+                results.append((None, None, False))
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return results, time.perf_counter() - started
+
+
+def summarize(concurrency, results, elapsed, calls):
+    latencies = np.array([r[0] for r in results if r[0] is not None and r[2]])
+    first_lines = np.array([r[1] for r in results if r[1] is not None and r[2]])
+
+    def ms(values, q):
+        return round(float(np.percentile(values, q)) * 1000, 1) if len(values) else None
+
+    level = {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "errors": sum(1 for r in results if not r[2]),
+        "p50_ms": ms(latencies, 50),
+        "p95_ms": ms(latencies, 95),
+        "p99_ms": ms(latencies, 99),
+        "first_line_p50_ms": ms(first_lines, 50),
+        "first_line_p95_ms": ms(first_lines, 95),
+        "throughput_rps": round(len(results) / elapsed, 2),
+        "upstream_calls": calls,
+    }
+    for name, per_endpoint in calls.items():
+        level[f"{name}_calls_per_request"] = round(sum(per_endpoint.values()) / max(len(results), 1), 2)
+    return level
+
+
+def print_table(levels):
+    columns = ["concurrency", "requests", "errors", "p50_ms", "p95_ms", "p99_ms", "first_line_p50_ms", "throughput_rps",
+               "fmp_calls_per_request", "gemini_calls_per_request"]
+    columns = [c for c in columns if any(level.get(c) is not None for level in levels)]
+    headers = [c.replace("_calls_per_request", " calls/req").replace("_ms", " ms").replace("_rps", " req/s").replace("_", " ") for c in columns]
+    widths = [max(len(h), 8) for h in headers]
+    print("  ".join(h.rjust(w) for h, w in zip(headers, widths)))
+    for level in levels:
+        print("  ".join(("-" if level.get(c) is None else str(level[c])).rjust(w) for c, w in zip(columns, widths)))
+
+
+def regressions(levels, baseline, tolerance):
+    # Levels compared by concurrency: higher p95 or calls per request, lower throughput
+    found = []
+    base_levels = {level["concurrency"]: level for level in baseline["levels"]}
+    for level in levels:
+        base = base_levels.get(level["concurrency"])
+        if not base:
+            continue
+        checks = [("p95_ms", 1), ("throughput_rps", -1), ("fmp_calls_per_request", 1), ("gemini_calls_per_request", 1)]
+        for key, direction in checks:
+            now, before = level.get(key), base.get(key)
+            if now is None or before is None:
+                continue
+            if (direction > 0 and now > before * (1 + tolerance) + 0.01) or (direction < 0 and now < before * (1 - tolerance)):
+                found.append(f"concurrency {level['concurrency']}: {key} {before} -> {now}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the digest endpoints against local FMP and Gemini stubs.")
+    parser.add_argument("--server", choices=["flask", "asgi"], default="flask", help="app to start in-process")
+    parser.add_argument("--url", help="drive an already running app instead of starting one")
+    parser.add_argument("--fmp-stub", help="URL of a running FMP stub, to count calls with --url")
+    parser.add_argument("--gemini-stub", help="URL of a running Gemini stub, to count calls with --url")
+    parser.add_argument("--mode", choices=["analyze", "stream", "batch"], default="analyze")
+    parser.add_argument("--batch-size", type=int, default=10, help="tickers per /analyze/batch request")
+    parser.add_argument("--workload", choices=["repeat", "unique"], default="repeat")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=32, help="requests per concurrency level")
+    parser.add_argument("--warmup", type=int, help="unmeasured requests first (default: one pass over the fixtures for repeat)")
+    parser.add_argument("--fmp-latency", type=float, default=0.08)
+    parser.add_argument("--gemini-latency", type=float, default=0.8)
+    parser.add_argument("--jitter", type=float, default=0.25)
+    parser.add_argument("--fmp-error-rate", type=float, default=0.0)
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="results file of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression against --baseline")
+    args = parser.parse_args()
+
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    per_request = args.batch_size if args.mode == "batch" else 1
+    templates = len(stubs.load_fixture("fmp.json")["companies"])
+    warmup = args.warmup if args.warmup is not None else (templates if args.workload == "repeat" else 0)
+    synthetic = (warmup + args.requests * len(levels)) * per_request
+
+    if args.url:
+        url = args.url.rstrip("/")
+        upstreams = Upstreams(args.fmp_stub, args.gemini_stub)
+    else:
+        fmp_stub = stubs.start_fmp(args.fmp_latency, args.jitter, args.fmp_error_rate, synthetic)
+        gemini_stub = stubs.start_gemini(args.gemini_latency, args.jitter, args.gemini_error_rate)
+        configure_app(fmp_stub.url, gemini_stub.url, tempfile.mkdtemp(prefix="digest-bench-"))
+        url = start_app(args.server)
+        upstreams = Upstreams(fmp_stub, gemini_stub)
+
+    queries = workload_queries(args.workload, synthetic)
+    lock = threading.Lock()
+    if warmup:
+        run_level(url, args.mode, queries, lock, 1, max(1, warmup // per_request), per_request)
+
+    results = []
+    for concurrency in levels:
+        before = upstreams.snapshot()
+        level_results, elapsed = run_level(url, args.mode, queries, lock, concurrency, args.requests, per_request)
+        results.append(summarize(concurrency, level_results, elapsed, Upstreams.delta(before, upstreams.snapshot())))
+
+    target = args.url or f"{args.server} (in-process)"
+    print(f"{args.mode} x {args.workload} on {target}: fmp {args.fmp_latency}s, gemini {args.gemini_latency}s, jitter {args.jitter}")
+    print_table(results)
+
+    run = {"settings": vars(args), "levels": results}
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(run, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for line in found:
+            print("Regression:", line)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import argparse
+import json
+import os
+
+import requests
+
+from config import FMP_BASE_URL, fmp_api_key
+from bench.stubs import FIXTURES_DIR
+
+# Records real FMP payloads into bench/fixtures/fmp.json for the FMP stub to replay:
+#
+#     cd backend && FMP_API_KEY=... python -m bench.record AAPL MSFT TSLA
+#
+# Each symbol gets its profile and its income and cash flow statements, replacing what
+# the fixture had for it; other companies are kept. Gemini answers stay canned.
+
+ENDPOINTS = ("income-statement", "cash-flow-statement")
+
+
+def fetch(path, **params):
+    response = requests.get(f"{FMP_BASE_URL}/{path}", params={**params, "apikey": fmp_api_key}, timeout=30)
+    response.raise_for_status()
+    return response.json()
+
+
+def record(symbol, years):
+    profile = fetch(f"profile/{symbol}")
+    if not profile:
+        raise ValueError(f"no profile for {symbol}")
+    company = {"profile": profile[0]}
+    for endpoint in ENDPOINTS:
+        company[endpoint] = fetch(f"{endpoint}/{symbol}", limit=years)
+    return company
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record FMP payloads into the benchmark fixtures.")
+    parser.add_argument("symbols", nargs="+")
+    parser.add_argument("--years", type=int, default=6, help="annual statements to keep per company")
+    args = parser.parse_args()
+    if not fmp_api_key:
+        parser.error("FMP_API_KEY is not set")
+
+    path = os.path.join(FIXTURES_DIR, "fmp.json")
+    with open(path) as f:
+        fixture = json.load(f)
+    for symbol in (s.upper() for s in args.symbols):
+        try:
+            fixture["companies"][symbol] = record(symbol, args.years)
+            print("Recorded", symbol)
+        except Exception as e:
+            # The exception text can carry the request URL, API key included
+            print(f"Record Error ({symbol}):", type(e).__name__)
+
+    with open(path + ".tmp", "w") as f:
+        json.dump(fixture, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Local stand-ins for FMP and Gemini, so the digest pipeline can be benchmarked offline:
+#
+#     cd backend && python -m bench.stubs --fmp-latency 0.08 --gemini-latency 0.8
+#
+# FMP answers from bench/fixtures/fmp.json (recorded or hand-built payloads, see
+# bench/record.py) plus any number of synthetic tickers (ZQX0001, ZQX0002, ...) derived
+# from them, so a load test can ask for companies no cache has seen. Gemini answers
+# generateContent with canned texts from bench/fixtures/gemini.json. Every response waits
+# latency * uniform(1 - jitter, 1 + jitter) seconds and fails with a 503 at error_rate.
+# GET /_stats returns call counts per endpoint; POST /_reset zeroes them.
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+SYNTHETIC_PREFIX = "ZQX"
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name)) as f:
+        return json.load(f)
+
+
+def synthetic_symbol(n):
+    return f"{SYNTHETIC_PREFIX}{n:04d}"
+
+
+class StubServer:
+    """Threaded HTTP stub: ``handle(method, path, query, body)`` returns (endpoint, status, payload)."""
+
+    def __init__(self, name, handle, latency=0.0, jitter=0.0, error_rate=0.0, error_payload=None, host="127.0.0.1", port=0):
+        self.name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_payload = error_payload or {"error": "stub failure"}
+        self.calls = Counter()
+        self.errors = Counter()
+        self._handle = handle
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name=f"{self.name}-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def stats(self):
+        with self._lock:
+            return {"calls": dict(self.calls), "errors": dict(self.errors)}
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+            self.errors.clear()
+
+    def _delay(self):
+        if self.latency > 0:
+            time.sleep(self.latency * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                self._serve("GET")
+
+            def do_POST(self):
+                self._serve("POST")
+
+            def _serve(self, method):
+                url = urlparse(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                if url.path == "/_stats":
+                    return self._send(200, stub.stats())
+                if url.path == "/_reset" and method == "POST":
+                    stub.reset()
+                    return self._send(200, {})
+                query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                try:
+                    endpoint, status, payload = stub._handle(method, url.path, query, body)
+                except Exception as e:
+                    print(f"{stub.name} Stub Error:", e)
+                    endpoint, status, payload = "unknown", 500, {"error": str(e)}
+                with stub._lock:
+                    stub.calls[endpoint] += 1
+                stub._delay()
+                if status == 200 and stub.error_rate and random.random() < stub.error_rate:
+                    status, payload = 503, stub.error_payload
+                if status != 200:
+                    with stub._lock:
+                        stub.errors[endpoint] += 1
+                self._send(status, payload)
+
+            def _send(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+
+class FMPData:
+    # Fixture companies plus ``synthetic`` derived tickers. A synthetic ticker copies a
+    # fixture company (its industry, the shape of its statements) scaled by a factor
+    # drawn from the ticker itself, so every run serves the same numbers.
+
+    def __init__(self, fixture, synthetic=0):
+        self.companies = fixture["companies"]
+        self.templates = sorted(self.companies)
+        self.synthetic = synthetic
+        self._derived = {}
+        self._lock = threading.Lock()
+
+    def symbols(self):
+        return self.templates + [synthetic_symbol(n) for n in range(1, self.synthetic + 1)]
+
+    def company(self, symbol):
+        symbol = symbol.upper()
+        if symbol in self.companies:
+            return self.companies[symbol]
+        match = re.fullmatch(SYNTHETIC_PREFIX + r"(\d+)", symbol)
+        if not match or not 1 <= int(match.group(1)) <= self.synthetic:
+            return None
+        with self._lock:
+            if symbol not in self._derived:
+                self._derived[symbol] = self._derive(symbol, int(match.group(1)))
+            return self._derived[symbol]
+
+    def _derive(self, symbol, n):
+        template = self.companies[self.templates[n % len(self.templates)]]
+        rng = random.Random(symbol)
+        scale = rng.uniform(0.05, 1.5)
+
+        def scaled(row):
+            out = {}
+            for key, value in row.items():
+                if key in ("pe", "priceToBookRatio", "debtToEquity", "currentRatio", "quickRatio"):
+                    out[key] = value
+                elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                    out[key] = int(value * scale * rng.uniform(0.9, 1.1))
+                else:
+                    out[key] = value
+            if "symbol" in out:
+                out["symbol"] = symbol
+            return out
+
+        profile = scaled(template["profile"])
+        profile["companyName"] = f"Benchmark Company {n:04d}"
+        profile["companyDescription"] = template["profile"]["companyDescription"].replace(
+            template["profile"]["companyName"], profile["companyName"]
+        )
+        return {
+            "profile": profile,
+            "income-statement": [scaled(row) for row in template["income-statement"]],
+            "cash-flow-statement": [scaled(row) for row in template["cash-flow-statement"]],
+        }
+
+    def listing(self):
+        rows = []
+        for symbol in self.symbols():
+            profile = self.company(symbol)["profile"]
+            rows.append({"symbol": symbol, "name": profile["companyName"], "exchangeShortName": profile.get("exchangeShortName"), "type": "stock"})
+        return rows
+
+    def search(self, query, limit):
+        query = query.lower()
+        found = [
+            {"symbol": symbol, "name": self.company(symbol)["profile"]["companyName"]}
+            for symbol in self.symbols()
+            if query in symbol.lower() or query in self.company(symbol)["profile"]["companyName"].lower()
+        ]
+        return found[:limit]
+
+    def screener(self, industry, limit):
+        rows = []
+        for symbol in self.symbols():
+            profile = self.company(symbol)["profile"]
+            if profile.get("industry") == industry:
+                rows.append({"symbol": symbol, "companyName": profile["companyName"], "marketCap": profile.get("mktCap"), "industry": industry})
+                if len(rows) >= limit:
+                    break
+        return rows
+
+
+def fmp_handler(data):
+    def handle(method, path, query, body):
+        path = path.split("/api/v3/", 1)[-1].strip("/")
+        endpoint, _, rest = path.partition("/")
+        limit = int(query.get("limit") or 1000)
+        if path == "stock/list":
+            return "stock/list", 200, data.listing()
+        if endpoint == "search":
+            return endpoint, 200, data.search(query.get("query", ""), limit)
+        if endpoint == "stock-screener":
+            return endpoint, 200, data.screener(query.get("industry"), limit)
+        if endpoint == "profile":
+            companies = [data.company(s) for s in rest.split(",") if s]
+            return endpoint, 200, [c["profile"] for c in companies if c]
+        if endpoint in ("income-statement", "cash-flow-statement"):
+            company = data.company(rest)
+            return endpoint, 200, company[endpoint][:limit] if company else []
+        return endpoint or "unknown", 404, {"Error Message": f"Unknown endpoint {path}"}
+
+    return handle
+
+
+def gemini_handler(fixture):
+    rules = fixture["rules"]
+
+    def handle(method, path, query, body):
+        if method != "POST" or not path.endswith(":generateContent"):
+            return "unknown", 404, {"error": {"code": 404, "message": f"Unknown path {path}", "status": "NOT_FOUND"}}
+        request = json.loads(body or b"{}")
+        prompt = " ".join(part.get("text", "") for content in request.get("contents", []) for part in content.get("parts", []))
+        text = next((rule["text"] for rule in rules if rule["match"] in prompt), fixture["default"])
+        return "generateContent", 200, {
+            "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP", "index": 0}],
+            "usageMetadata": {"promptTokenCount": len(prompt) // 4, "candidatesTokenCount": len(text) // 4},
+        }
+
+    return handle
+
+
+def start_fmp(latency=0.0, jitter=0.0, error_rate=0.0, synthetic=0, port=0):
+    data = FMPData(load_fixture("fmp.json"), synthetic)
+    return StubServer(
+        "fmp", fmp_handler(data), latency, jitter, error_rate,
+        error_payload={"Error Message": "Service temporarily unavailable"}, port=port,
+    ).start()
+
+
+def start_gemini(latency=0.0, jitter=0.0, error_rate=0.0, port=0):
+    return StubServer(
+        "gemini", gemini_handler(load_fixture("gemini.json")), latency, jitter, error_rate,
+        error_payload={"error": {"code": 503, "message": "The model is overloaded.", "status": "UNAVAILABLE"}}, port=port,
+    ).start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the FMP and Gemini stubs until interrupted.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--fmp-port", type=int, default=8765)
+    parser.add_argument("--gemini-port", type=int, default=8766)
+    parser.add_argument("--fmp-latency", type=float, default=0.08, help="seconds per FMP response")
+    parser.add_argument("--gemini-latency", type=float, default=0.8, help="seconds per generateContent response")
+    parser.add_argument("--jitter", type=float, default=0.25, help="latency spread, as a fraction of the latency")
+    parser.add_argument("--fmp-error-rate", type=float, default=0.0)
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0)
+    parser.add_argument("--synthetic", type=int, default=1000, help="synthetic tickers served next to the fixtures")
+    args = parser.parse_args()
+
+    fmp = start_fmp(args.fmp_latency, args.jitter, args.fmp_error_rate, args.synthetic, args.fmp_port)
+    gemini = start_gemini(args.gemini_latency, args.jitter, args.gemini_error_rate, args.gemini_port)
+    print(f"FMP stub:    {fmp.url}  (FMP_BASE_URL={fmp.url}/api/v3)")
+    print(f"Gemini stub: {gemini.url}  (GEMINI_API_ENDPOINT={gemini.url})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fmp.stop()
+        gemini.stop()
+
+
+if __name__ == "__main__":
+    main()
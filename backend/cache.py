@@ -0,0 +1,185 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
+import json
+import sqlite3
+import threading
+import time
+
+# The ASGI server's SQLite work (cache tiers, statement store, invalidation), kept off the
+# event loop and out of asyncio's default pool, which blocking calls can fill
+store_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="store")
+
+
+async def run_in_store_thread(fn, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(store_executor, functools.partial(fn, *args, **kwargs))
+
+
+class TTLCache:
+    """Size-bounded LRU with per-entry TTLs, stale-while-revalidate and an optional SQLite tier.
+
+    Entries are fresh until ``ttl`` seconds old, then servable-but-stale for another
+    ``stale_ttl`` seconds while a background refresh runs. Values must be JSON-serializable
+    when ``db_path`` is set, since the disk tier stores them as JSON text.
+    """
+
+    def __init__(self, name, max_entries, db_path=None):
+        self.name = name
+        self.max_entries = max_entries
+        self.stats = {"hits": 0, "stale_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self._entries = OrderedDict()  # key -> (value, fresh_until, stale_until)
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "name TEXT, key TEXT, value TEXT, fresh_until REAL, stale_until REAL, "
+                "PRIMARY KEY (name, key))"
+            )
+            self._db.execute("DELETE FROM cache WHERE stale_until < ?", (time.time(),))
+            self._db.commit()
+
+    def _remember(self, key, entry):
+        # Caller holds the lock
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _load(self, key):
+        # Caller holds the lock
+        if self._db is None:
+            return None
+        row = self._db.execute(
+            "SELECT value, fresh_until, stale_until FROM cache WHERE name = ? AND key = ?",
+            (self.name, key),
+        ).fetchone()
+        if row is None:
+            return None
+        entry = (json.loads(row[0]), row[1], row[2])
+        self._remember(key, entry)
+        return entry
+
+    def get(self, key):
+        """Return ``(value, state)`` where state is "fresh", "stale" or None on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            from_disk = entry is None
+            if entry is not None:
+                self._entries.move_to_end(key)
+            else:
+                entry = self._load(key)
+            if entry is None or entry[2] <= now:
+                self.stats["misses"] += 1
+                return None, None
+            if from_disk:
+                self.stats["disk_hits"] += 1
+            if entry[1] > now:
+                self.stats["hits"] += 1
+                return entry[0], "fresh"
+            self.stats["stale_hits"] += 1
+            return entry[0], "stale"
+
+    def state(self, key):
+        """Return "fresh", "stale" or None like ``get()``, without counting a lookup."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key) or self._load(key)
+        if entry is None or entry[2] <= now:
+            return None
+        return "fresh" if entry[1] > now else "stale"
+
+    def peek(self, key):
+        """Return the last value stored for ``key`` however old it is, or None."""
+        with self._lock:
+            entry = self._entries.get(key) or self._load(key)
+        return entry[0] if entry else None
+
+    def set(self, key, value, ttl, stale_ttl=0):
+        now = time.time()
+        entry = (value, now + ttl, now + ttl + stale_ttl)
+        with self._lock:
+            self._remember(key, entry)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)",
+                    (self.name, key, json.dumps(value), entry[1], entry[2]),
+                )
+                self._db.commit()
+
+    def invalidate(self, predicate):
+        """Drop every entry whose key matches ``predicate``; returns how many were dropped."""
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                del self._entries[key]
+            if self._db is not None:
+                rows = self._db.execute("SELECT key FROM cache WHERE name = ?", (self.name,)).fetchall()
+                stale_keys = [(self.name, row[0]) for row in rows if predicate(row[0])]
+                self._db.executemany("DELETE FROM cache WHERE name = ? AND key = ?", stale_keys)
+                self._db.commit()
+                keys = set(keys) | {key for _, key in stale_keys}
+        return len(keys)
+
+    def get_or_fetch(self, key, fetch, ttl, stale_ttl=0, executor=None):
+        """Serve ``key`` from cache, calling ``fetch()`` on a miss.
+
+        A stale entry is returned immediately and refreshed on ``executor`` in the
+        background. ``fetch()`` returning None means "do not cache".
+        """
+        value, state = self.get(key)
+        if state == "fresh":
+            return value
+        if state == "stale" and executor is not None:
+            self.refresh_later(key, fetch, ttl, stale_ttl, executor)
+            return value
+        value = fetch()
+        if value is not None:
+            self.set(key, value, ttl, stale_ttl)
+        return value
+
+    def refresh_later(self, key, fetch, ttl, stale_ttl, executor):
+        # At most one background refresh per key at a time
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                value = fetch()
+                if value is not None:
+                    self.set(key, value, ttl, stale_ttl)
+            except Exception as e:
+                print(f"Cache Refresh Error ({self.name} {key}):", e)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        executor.submit(refresh)
+
+    # For the event loop: a memory-only cache answers in place; with a SQLite tier, reads
+    # and commits (and the lock that pool threads hold during theirs) go to a store thread
+    async def get_async(self, key):
+        return await self._off_loop(self.get, key)
+
+    async def set_async(self, key, value, ttl, stale_ttl=0):
+        return await self._off_loop(self.set, key, value, ttl, stale_ttl)
+
+    async def peek_async(self, key):
+        return await self._off_loop(self.peek, key)
+
+    async def _off_loop(self, fn, *args):
+        if self._db is None:
+            return fn(*args)
+        return await run_in_store_thread(fn, *args)
+
+    def hit_rate(self):
+        hits = self.stats["hits"] + self.stats["stale_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
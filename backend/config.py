@@ -0,0 +1,85 @@
+import os
+from dotenv import load_dotenv
+
+# ✅ Load .env file
+load_dotenv()
+
+# ✅ Get API keys from environment
+fmp_api_key = os.getenv("FMP_API_KEY")
+gemini_api_key = os.getenv("GEMINI_API_KEY")
+
+# FMP fetch layer: one shared connection pool, bounded fan-out, per-call timeouts
+FMP_BASE_URL = os.getenv("FMP_BASE_URL", "https://financialmodelingprep.com/api/v3")
+FMP_MAX_WORKERS = int(os.getenv("FMP_MAX_WORKERS", "16"))
+FMP_POOL_SIZE = int(os.getenv("FMP_POOL_SIZE", "32"))
+FMP_CONNECT_TIMEOUT = float(os.getenv("FMP_CONNECT_TIMEOUT", "3.05"))
+FMP_READ_TIMEOUT = float(os.getenv("FMP_READ_TIMEOUT", "10"))
+
+# Gemini: one model object for the process, bounded concurrent generations
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+LLM_MAX_WORKERS = int(os.getenv("LLM_MAX_WORKERS", "8"))
+LLM_CALL_TIMEOUT = float(os.getenv("LLM_CALL_TIMEOUT", "20"))
+LLM_TOTAL_TIMEOUT = float(os.getenv("LLM_TOTAL_TIMEOUT", "45"))
+
+# FMP response cache: in-process LRU plus an optional SQLite tier that survives restarts
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "4096"))
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", "")
+# (fresh, stale-while-revalidate) seconds per FMP endpoint. Profiles carry price-driven
+# fields such as pe and mktCap, so they go stale quickly; statements change quarterly.
+FMP_CACHE_TTLS = {
+    "search": (86400, 7 * 86400),
+    "profile": (int(os.getenv("CACHE_PROFILE_TTL", "300")), 3600),
+    "income-statement": (int(os.getenv("CACHE_STATEMENT_TTL", "86400")), 7 * 86400),
+    "cash-flow-statement": (int(os.getenv("CACHE_STATEMENT_TTL", "86400")), 7 * 86400),
+    "stock-screener": (int(os.getenv("CACHE_SCREENER_TTL", "86400")), 7 * 86400),
+}
+
+# Gemini generation cache, keyed by model and a hash of the normalized prompt
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2048"))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "86400"))
+# Significant figures of market cap, P/E and P/B in prompts, so quote moves keep the key
+PROMPT_PRICE_DIGITS = int(os.getenv("PROMPT_PRICE_DIGITS", "2"))
+
+# Batch /analyze/batch: tickers per request, tickers built at once across all batches,
+# and symbols per comma-separated FMP profile call
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "200"))
+BATCH_MAX_WORKERS = int(os.getenv("BATCH_MAX_WORKERS", "8"))
+FMP_PROFILE_BATCH_SIZE = int(os.getenv("FMP_PROFILE_BATCH_SIZE", "50"))
+
+# Local statement store: backfilled once, then topped up with only the newest periods
+STATEMENT_DB_PATH = os.getenv("STATEMENT_DB_PATH", "statements.db")
+HISTORY_YEARS = int(os.getenv("HISTORY_YEARS", "5"))
+STORE_BACKFILL_YEARS = int(os.getenv("STORE_BACKFILL_YEARS", "20"))
+STORE_INCREMENTAL_LIMIT = int(os.getenv("STORE_INCREMENTAL_LIMIT", "2"))
+STORE_CHECK_INTERVAL = int(os.getenv("STORE_CHECK_INTERVAL", "86400"))
+STORE_FULL_REFRESH_INTERVAL = int(os.getenv("STORE_FULL_REFRESH_INTERVAL", str(30 * 86400)))
+
+# Industry peer index: peers per industry with precomputed metrics, rebuilt in the background
+PEER_INDEX_LIMIT = int(os.getenv("PEER_INDEX_LIMIT", "50"))
+PEER_INDEX_REFRESH_INTERVAL = int(os.getenv("PEER_INDEX_REFRESH_INTERVAL", "86400"))
+PEER_INDEX_INDUSTRIES = [i.strip() for i in os.getenv("PEER_INDEX_INDUSTRIES", "").split(",") if i.strip()]
+PEER_DISPLAY_LIMIT = int(os.getenv("PEER_DISPLAY_LIMIT", "5"))
+PEER_INDEX_MAX_WORKERS = int(os.getenv("PEER_INDEX_MAX_WORKERS", "4"))  # industries built at once
+
+# Ticker resolution: listing snapshot searched in memory, reloaded from FMP stock/list daily
+SYMBOL_INDEX_PATH = os.getenv("SYMBOL_INDEX_PATH", "symbols.json")
+SYMBOL_INDEX_REFRESH_INTERVAL = int(os.getenv("SYMBOL_INDEX_REFRESH_INTERVAL", "86400"))
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "8"))
+
+# Upstream client policy: rate limits (calls/second and burst), retries with jittered
+# backoff, circuit breakers and the overall time budget of one /analyze request
+REQUEST_BUDGET = float(os.getenv("REQUEST_BUDGET", "60"))
+FMP_RATE_LIMIT = float(os.getenv("FMP_RATE_LIMIT", "10"))
+FMP_RATE_BURST = int(os.getenv("FMP_RATE_BURST", "40"))
+GEMINI_RATE_LIMIT = float(os.getenv("GEMINI_RATE_LIMIT", "2"))
+GEMINI_RATE_BURST = int(os.getenv("GEMINI_RATE_BURST", "8"))
+RETRY_LIMIT = int(os.getenv("RETRY_LIMIT", "3"))  # retries after the first attempt
+RETRY_BACKOFF_BASE = float(os.getenv("RETRY_BACKOFF_BASE", "0.25"))
+RETRY_BACKOFF_MAX = float(os.getenv("RETRY_BACKOFF_MAX", "4"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))
+# Point Gemini at another endpoint (e.g. a local stub, http://127.0.0.1:8766); uses REST
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT", "")
+
+# Per-request traces (request ID and per-stage timings) as JSON lines; "-" for stdout, empty to disable
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "")
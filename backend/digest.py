@@ -0,0 +1,310 @@
+# Turns raw FMP payloads into the digest. Nothing here does I/O, so the sync (Flask)
+# and async (ASGI) servers share it and only differ in how they fetch and generate.
+
+import math
+
+from config import PEER_DISPLAY_LIMIT, PROMPT_PRICE_DIGITS
+import metrics
+
+
+def price_bucket(value, digits=PROMPT_PRICE_DIGITS):
+    # Price-driven values (market cap, P/E, P/B) move with every quote, and the prompt is
+    # the generation cache key, so prompts carry them to a few significant figures only:
+    # 2934512000000 -> 2900000000000, 28.37 -> 28.0. Anything non-numeric passes through.
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value) or value == 0:
+        return value
+    return round(value, digits - 1 - math.floor(math.log10(abs(value))))
+
+
+def assemble_digest(company_name, symbol, profile, income_data, cashflow_data, industry_peers):
+    # Returns (financial_data, prompts): every numeric section plus the Gemini prompt for
+    # each generated section. On failure financial_data is an {"error": ...} payload.
+    latest_income = income_data[0] if len(income_data) > 0 else {}
+    prev_income = income_data[1] if len(income_data) > 1 else None
+    latest_year = str(latest_income.get("calendarYear", "latest"))
+    prev_year = str(prev_income.get("calendarYear", "prev")) if prev_income else None
+
+    # Every derived series comes from the columnar statements in metrics.py
+    income = metrics.load(income_data, metrics.INCOME_FIELDS)
+    cash = metrics.load(cashflow_data, metrics.CASHFLOW_FIELDS)
+    gross_margins = metrics.ratio(income["grossProfit"], income["revenue"])
+    profit_margins = metrics.ratio(income["netIncome"], income["revenue"])
+    revenue_growths = metrics.yoy_growth(income["revenue"])
+    net_income_growths = metrics.yoy_growth(income["netIncome"])
+    latest_gross_margin = metrics.scalar(metrics.latest(gross_margins))
+    latest_profit_margin = metrics.scalar(metrics.latest(profit_margins))
+
+    industry = profile.get("industry", None)
+    industry_insights = None
+    if industry:
+        # Industry insights: compare main company to its largest competitors, ranked
+        # (1 = highest) against every peer in the industry index
+        peers = [p for p in industry_peers if p["symbol"] != symbol]
+        competitor_metrics = peers[:PEER_DISPLAY_LIMIT]
+        peer_values = {
+            key: [value] + [p[key] for p in peers]
+            for key, value in (
+                ("revenue", latest_income.get("revenue", 0)),
+                ("profitMargins", latest_profit_margin),
+                ("marketCap", profile.get("mktCap", 0)),
+            )
+        }
+        industry_insights = {
+            "competitors": competitor_metrics,
+            "peerCount": len(peers),
+            "companyRank": {key: metrics.rank_of(values) for key, values in peer_values.items()}
+        }
+
+    # Step 6: Market share (for automobile industry only)
+    market_share = None
+    if industry and "automobile" in industry.lower():
+        # Calculate market share based on revenue among the displayed peers
+        shares = metrics.to_list(metrics.shares([latest_income.get("revenue", 0)] + [c["revenue"] for c in industry_insights["competitors"]]), digits=2)
+        if shares[0] is not None:
+            market_share = {
+                "company": shares[0],
+                "competitors": shares[1:]
+            }
+
+    # Step 7: Historical trends
+    historical_trends = {
+        "years": metrics.periods(income_data),
+        "revenue": metrics.to_list(income["revenue"]),
+        "netIncome": metrics.to_list(income["netIncome"]),
+        "grossMargins": metrics.to_list(gross_margins),
+        "profitMargins": metrics.to_list(profit_margins),
+        "revenueGrowth": metrics.to_list(revenue_growths),
+        "netIncomeGrowth": metrics.to_list(net_income_growths),
+        "revenueCagr": metrics.scalar(metrics.cagr(income["revenue"]))
+    }
+    cash_flow_ratios = metrics.cash_flow_ratios(cash)
+    cash_flow_trend = {
+        "years": metrics.periods(cashflow_data),
+        "operating": metrics.to_list(cash["operatingCashFlow"]),
+        "investing": metrics.to_list(cash["cashflowFromInvestment"]),
+        "financing": metrics.to_list(cash["cashflowFromFinancing"]),
+        "freeCashFlow": metrics.to_list(cash_flow_ratios["freeCashFlow"]),
+        "capexToOperating": metrics.to_list(cash_flow_ratios["capexToOperating"])
+    }
+
+    # Step 8: Extract required fields from latest year
+    financial_data = {
+        "company": profile.get("companyName", company_name),
+        "symbol": symbol,
+        "sector": profile.get("sector", "N/A"),
+        "industry": industry,
+        "marketCap": profile.get("mktCap", 0),
+        "revenue": latest_income.get("revenue", 0),
+        "netIncome": latest_income.get("netIncome", 0),
+        "grossMargins": latest_gross_margin,
+        "profitMargins": latest_profit_margin,
+        "peRatio": profile.get("pe", None),
+        "pbRatio": profile.get("priceToBookRatio", None),
+        "historicalTrends": historical_trends,
+        "cashFlow": cash_flow_trend,
+        "industryInsights": industry_insights,
+        "marketShare": market_share
+    }
+
+    # Step 5: Gemini Comments (price-driven values bucketed, see PROMPT_PRICE_DIGITS)
+    comment_prompt = f"""
+You are a financial analyst. Provide a one-sentence insight for each metric below.
+Return valid JSON with keys: revenue, netIncome, grossMargins, profitMargins, peRatio, pbRatio
+
+- Revenue: {financial_data['revenue']}
+- Net Income: {financial_data['netIncome']}
+- Gross Margins: {financial_data['grossMargins']}
+- Profit Margins: {financial_data['profitMargins']}
+- PE Ratio: {price_bucket(financial_data['peRatio'])}
+- PB Ratio: {price_bucket(financial_data['pbRatio'])}
+"""
+
+    # Step 6: Forecast (real data only, with year keys)
+    try:
+        if prev_income:
+            rev_prev = prev_income.get("revenue", 0)
+            ni_prev = prev_income.get("netIncome", 0)
+            revenue_growth = metrics.scalar(metrics.latest(revenue_growths), default=0)
+            net_income_growth = metrics.scalar(metrics.latest(net_income_growths), default=0)
+        else:
+            rev_prev = None
+            ni_prev = None
+            revenue_growth = 0
+            net_income_growth = 0
+
+        # Predict next year based on latest growth
+        if latest_year.isdigit():
+            next_year = str(int(latest_year) + 1)
+        else:
+            next_year = "next"
+
+        # With a single period there is no previous year to key (a None key also breaks
+        # Flask's sorted JSON output), so the entry is left out
+        financial_data["forecast"] = {
+            **({prev_year: {"revenue": rev_prev, "netIncome": ni_prev}} if prev_income else {}),
+            latest_year: {"revenue": financial_data["revenue"], "netIncome": financial_data["netIncome"]},
+            next_year: {
+                "revenue": round(financial_data["revenue"] * (1 + revenue_growth), 2),
+                "netIncome": round(financial_data["netIncome"] * (1 + net_income_growth), 2)
+            }
+        }
+    except Exception as e:
+        print("Forecast Error:", e)
+        return {"error": "Forecast generation failed."}, {}
+
+    # Step 7: Insight
+    insight_prompt = f"""
+Write 3 professional financial insight bullet points based on this company:
+- Sector: {financial_data['sector']}
+- Market Cap: {price_bucket(financial_data['marketCap'])}
+- Revenue: {financial_data['revenue']}
+- Net Income: {financial_data['netIncome']}
+- Gross Margins: {financial_data['grossMargins']}
+- Profit Margins: {financial_data['profitMargins']}
+- PE Ratio: {price_bucket(financial_data['peRatio'])}
+- PB Ratio: {price_bucket(financial_data['pbRatio'])}
+Avoid numbers. Focus on trends and sentiment.
+"""
+
+    # Step 8: News (FMP doesn't have news in free tier; skip or use another source)
+    financial_data["news"] = []  # Optional: integrate another news API
+
+    # Step 9: Graph Inference (real data only)
+    try:
+        rev = financial_data["revenue"]
+        ni = financial_data["netIncome"]
+        rev_growth = revenue_growth if prev_income else None
+        ni_growth = net_income_growth if prev_income else None
+        if rev_growth is not None and ni_growth is not None:
+            if rev_growth > 0 and ni_growth > 0:
+                inference = f"Both revenue and net income have increased compared to last year, indicating positive growth."
+            elif rev_growth > 0 and ni_growth < 0:
+                inference = f"Revenue has grown, but net income has decreased, suggesting rising costs or reduced profitability."
+            elif rev_growth < 0 and ni_growth > 0:
+                inference = f"Revenue has declined, but net income increased, indicating improved efficiency or cost management."
+            else:
+                inference = f"Both revenue and net income have decreased compared to last year, signaling a potential downturn."
+        else:
+            inference = "Insufficient data to determine growth trends."
+        financial_data["graphInference"] = inference
+    except Exception as e:
+        print("Graph Inference Error:", e)
+        financial_data["graphInference"] = "Unable to generate graph inference due to data error."
+
+    # Step 9: Qualitative and additional real-data-based insights
+    # All insights are single-line, real-data-based, and concise
+    qualitative_factors = f"Industry: {industry or 'N/A'}. Sector: {profile.get('sector', 'N/A')}."
+    net_margin = latest_profit_margin
+    company_segregation = f"Company operates in {industry or 'various industries'} with a focus on {profile.get('sector', 'N/A')}."
+    future_investments = profile.get('companyDescription', '').split('.')[-2] if profile.get('companyDescription') else 'N/A'
+    current_investments = profile.get('companyDescription', '').split('.')[-3] if profile.get('companyDescription') else 'N/A'
+    future_demands = f"Demand outlook: {profile.get('sector', 'N/A')} sector expected to grow based on recent trends."
+    financial_health = f"Debt/Equity: {profile.get('debtToEquity', 'N/A')}, Current Ratio: {profile.get('currentRatio', 'N/A')}, Quick Ratio: {profile.get('quickRatio', 'N/A')}."
+    # Market share already calculated for automobile industry
+
+    # Add all to financial_data
+    financial_data["qualitativeFactors"] = qualitative_factors
+    financial_data["netMargin"] = net_margin
+    financial_data["companySegregation"] = company_segregation
+    financial_data["futureInvestments"] = future_investments
+    financial_data["currentInvestments"] = current_investments
+    financial_data["futureDemands"] = future_demands
+    financial_data["financialHealth"] = financial_health
+
+    # Fetch real investments and financial health data
+    # Investments: Use capital expenditures and R&D from cash flow/income statement
+    capex = None
+    rnd = None
+    if len(cashflow_data) > 0:
+        capex = cashflow_data[0].get('capitalExpenditure')
+    if len(income_data) > 0:
+        rnd = income_data[0].get('researchAndDevelopmentExpenses')
+    financial_data["currentInvestments"] = f"Capital Expenditure: ${capex:,}" if capex is not None else "No data"
+    financial_data["futureInvestments"] = f"R&D Expenses: ${rnd:,}" if rnd is not None else "No data"
+    # Financial Health: Use real ratios from profile
+    debt_to_equity = profile.get('debtToEquity')
+    current_ratio = profile.get('currentRatio')
+    quick_ratio = profile.get('quickRatio')
+    financial_data["financialHealth"] = f"Debt/Equity: {debt_to_equity if debt_to_equity is not None else 'No data'}, Current Ratio: {current_ratio if current_ratio is not None else 'No data'}, Quick Ratio: {quick_ratio if quick_ratio is not None else 'No data'}"
+
+    # Helper for real-data fallback
+    def real_or_unavailable(value, label=None):
+        if value is None or value == '' or (isinstance(value, (int, float)) and value == 0):
+            return f"Not reported by company" if label is None else f"{label}: Not reported by company"
+        return value
+
+    # Use helper for all fields that may be missing
+    financial_data["grossMargins"] = real_or_unavailable(latest_gross_margin, "Gross Margin")
+    financial_data["profitMargins"] = real_or_unavailable(latest_profit_margin, "Profit Margin")
+    financial_data["peRatio"] = real_or_unavailable(profile.get("pe", None), "PE Ratio")
+    financial_data["pbRatio"] = real_or_unavailable(profile.get("priceToBookRatio", None), "PB Ratio")
+    financial_data["netMargin"] = real_or_unavailable(latest_profit_margin, "Net Margin")
+    financial_data["qualitativeFactors"] = real_or_unavailable(financial_data.get("qualitativeFactors", None), "Qualitative Factors")
+    financial_data["companySegregation"] = real_or_unavailable(financial_data.get("companySegregation", None), "Company Segregation")
+    financial_data["futureInvestments"] = real_or_unavailable(financial_data.get("futureInvestments", None), "Future Investments")
+    financial_data["currentInvestments"] = real_or_unavailable(financial_data.get("currentInvestments", None), "Current Investments")
+    financial_data["futureDemands"] = real_or_unavailable(financial_data.get("futureDemands", None), "Future Demands")
+    financial_data["financialHealth"] = real_or_unavailable(financial_data.get("financialHealth", None), "Financial Health")
+
+    # Step 10: Market Insights (always present, deep, real-data-based)
+    market_insight_prompt = f"""
+You are a financial analyst. Based on the following real data, provide 2-3 deep, analytical, and insightful bullet points about this company's financial performance, trends, and risks. Use real numbers and trends, avoid generic statements. If a value is missing, use the best available context or explain why it's missing.
+
+- Company: {financial_data['company']}
+- Sector: {financial_data['sector']}
+- Industry: {financial_data.get('industry', 'N/A')}
+- Market Cap: {price_bucket(financial_data['marketCap'])}
+- Revenue: {financial_data['revenue']}
+- Net Income: {financial_data['netIncome']}
+- Gross Margin: {financial_data['grossMargins']}
+- Profit Margin: {financial_data['profitMargins']}
+- PE Ratio: {price_bucket(financial_data['peRatio'])}
+- PB Ratio: {price_bucket(financial_data['pbRatio'])}
+- Debt/Equity: {profile.get('debtToEquity', 'N/A')}
+- Current Ratio: {profile.get('currentRatio', 'N/A')}
+- Quick Ratio: {profile.get('quickRatio', 'N/A')}
+- Historical Revenue: {financial_data['historicalTrends']['revenue']}
+- Historical Net Income: {financial_data['historicalTrends']['netIncome']}
+- Cash Flow: {financial_data['cashFlow']}
+"""
+
+    # Cash Flow Inference (real data, AI-generated)
+    cashflow_inference_prompt = f"""
+You are a financial analyst. Based on the following cash flow data (operating, investing, financing for the last {len(financial_data['cashFlow']['years'])} years), provide a concise, real-data-based inference (1-2 sentences) about the company's cash flow trends, strengths, and risks. Use real numbers and trends, avoid generic statements.
+
+Operating Cash Flow: {financial_data['cashFlow']['operating']}
+Investing Cash Flow: {financial_data['cashFlow']['investing']}
+Financing Cash Flow: {financial_data['cashFlow']['financing']}
+Years: {financial_data['cashFlow']['years']}
+"""
+
+    financial_data["comments"] = {}
+    prompts = {
+        "Comment": comment_prompt,
+        "Insight": insight_prompt,
+        "Market Insights": market_insight_prompt,
+        "Cash Flow Inference": cashflow_inference_prompt,
+    }
+    return financial_data, prompts
+
+
+def generation_stage(name):
+    # Stage name for timing a generation: "Market Insights" -> "gemini_market_insights"
+    return "gemini_" + name.lower().replace(" ", "_")
+
+
+def generation_section(name, result, comments):
+    # Maps one finished generation to the digest section it fills, with fallbacks for
+    # failed or timed-out calls. Comments and the cash-flow inference share "comments",
+    # so the merged dict is threaded through and returned alongside the section.
+    if name == "Comment":
+        comments = {**(result if isinstance(result, dict) else {}), **comments}
+        return {"comments": comments}, comments
+    if name == "Cash Flow Inference":
+        if not result:
+            return None, comments
+        comments = {**comments, "cashFlow": result}
+        return {"comments": comments}, comments
+    if name == "Insight":
+        return {"insight": result or "Unable to generate insights at this time."}, comments
+    return {"marketInsights": result or "Unable to generate market insights due to data error."}, comments
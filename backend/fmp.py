@@ -0,0 +1,410 @@
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+import asyncio
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import (
+    fmp_api_key,
+    FMP_BASE_URL,
+    FMP_MAX_WORKERS,
+    FMP_POOL_SIZE,
+    FMP_CONNECT_TIMEOUT,
+    FMP_READ_TIMEOUT,
+    CACHE_MAX_ENTRIES,
+    CACHE_DB_PATH,
+    FMP_CACHE_TTLS,
+    FMP_PROFILE_BATCH_SIZE,
+    STATEMENT_DB_PATH,
+    HISTORY_YEARS,
+    STORE_BACKFILL_YEARS,
+    STORE_INCREMENTAL_LIMIT,
+    STORE_CHECK_INTERVAL,
+    STORE_FULL_REFRESH_INTERVAL,
+    PEER_INDEX_LIMIT,
+    PEER_INDEX_REFRESH_INTERVAL,
+    PEER_INDEX_INDUSTRIES,
+    PEER_INDEX_MAX_WORKERS,
+    SYMBOL_INDEX_PATH,
+    SYMBOL_INDEX_REFRESH_INTERVAL,
+    FMP_RATE_LIMIT,
+    FMP_RATE_BURST,
+    RETRY_LIMIT,
+    RETRY_BACKOFF_BASE,
+    RETRY_BACKOFF_MAX,
+    BREAKER_FAILURE_THRESHOLD,
+    BREAKER_RESET_TIMEOUT,
+)
+from cache import TTLCache, run_in_store_thread
+from metrics import competitor_rows
+from peers import IndustryIndex
+from policy import RetryableError, Upstream, UpstreamUnavailable, retry_after, submit
+from symbols import SymbolIndex
+from telemetry import register_cache, register_stats, register_upstream, stage, timed
+from singleflight import AsyncSingleFlight, SingleFlight
+from statements import StatementStore
+
+
+class CompanyNotFound(Exception):
+    """FMP has no profile for the symbol (an unknown or delisted ticker)."""
+
+
+# One keep-alive pool shared by every request. pool_block makes callers wait for a
+# free connection instead of opening unbounded extra sockets to the same host.
+session = requests.Session()
+session.headers.update({"User-Agent": "Mozilla/5.0"})
+_adapter = HTTPAdapter(pool_connections=4, pool_maxsize=FMP_POOL_SIZE, pool_block=True)
+session.mount("https://", _adapter)
+session.mount("http://", _adapter)
+
+# Bounded fan-out for independent FMP calls. Only leaf HTTP calls are submitted here,
+# never code that waits on other futures, so the pool cannot deadlock on itself.
+executor = ThreadPoolExecutor(max_workers=FMP_MAX_WORKERS, thread_name_prefix="fmp")
+# Whole-industry peer builds, which wait on the FMP executor's futures and so cannot run on it
+industry_executor = ThreadPoolExecutor(max_workers=PEER_INDEX_MAX_WORKERS, thread_name_prefix="peers")
+
+# Rate limit, retries and circuit breaker for every FMP call, sync or async
+fmp_upstream = Upstream(
+    "fmp",
+    rate=FMP_RATE_LIMIT,
+    burst=FMP_RATE_BURST,
+    call_timeout=FMP_READ_TIMEOUT,
+    max_retries=RETRY_LIMIT,
+    backoff_base=RETRY_BACKOFF_BASE,
+    backoff_max=RETRY_BACKOFF_MAX,
+    failure_threshold=BREAKER_FAILURE_THRESHOLD,
+    reset_timeout=BREAKER_RESET_TIMEOUT,
+)
+
+# Responses keyed by path and query (never the API key), with TTLs per endpoint
+fmp_cache = TTLCache("fmp", CACHE_MAX_ENTRIES, db_path=CACHE_DB_PATH or None)
+# Identical cache misses in flight at the same time (e.g. peers shared by several tickers)
+# share one upstream call
+inflight = SingleFlight()
+async_inflight = AsyncSingleFlight()
+
+# Company income and cash-flow statements are read from the local store, which only
+# asks FMP for periods it does not have yet
+statement_store = StatementStore(
+    STATEMENT_DB_PATH,
+    backfill=STORE_BACKFILL_YEARS,
+    incremental=STORE_INCREMENTAL_LIMIT,
+    check_interval=STORE_CHECK_INTERVAL,
+    full_refresh_interval=STORE_FULL_REFRESH_INTERVAL,
+)
+
+# The ASGI server's client, created inside its event loop on first use. Like pool_block
+# above, a call waits for a free pooled connection rather than failing.
+_async_client = None
+
+
+def check_status(path, response):
+    # 429 and 5xx are worth another attempt; other statuses go back to the caller
+    if response.status_code == 429 or response.status_code >= 500:
+        raise RetryableError(f"{path}: HTTP {response.status_code}", retry_after(response.headers.get("Retry-After")))
+    return response
+
+
+def fmp_get(path, **params):
+    # Raises UpstreamUnavailable once retries are exhausted or while the circuit is open
+    params["apikey"] = fmp_api_key
+
+    def send(timeout):
+        try:
+            response = session.get(
+                f"{FMP_BASE_URL}/{path}",
+                params=params,
+                timeout=(min(FMP_CONNECT_TIMEOUT, timeout), timeout),
+            )
+        except requests.RequestException as e:
+            # The exception text carries the URL, API key included, so only its type is kept
+            raise RetryableError(f"{path}: {type(e).__name__}") from e
+        return check_status(path, response)
+
+    return fmp_upstream.call(send, endpoint=path.split("/")[0])
+
+
+def cache_key(path, params):
+    return f"{path}?{urlencode(sorted(params.items()))}"
+
+
+def fetch_json(path, params):
+    # Non-200 responses and unavailable upstreams come back as None and are never cached
+    try:
+        response = fmp_get(path, **params)
+    except UpstreamUnavailable as e:
+        print("FMP Error:", e)
+        return None
+    return response.json() if response.status_code == 200 else None
+
+
+def fmp_json(path, **params):
+    ttl, stale_ttl = FMP_CACHE_TTLS.get(path.split("/")[0], (0, 0))
+    if not ttl:
+        return fetch_json(path, params)
+    key = cache_key(path, params)
+
+    def fetch():
+        return inflight.do(key, lambda: fetch_json(path, params))
+
+    value = fmp_cache.get_or_fetch(key, fetch, ttl, stale_ttl, executor=executor)
+    # While FMP fails, an expired copy is better than nothing
+    return value if value is not None else fmp_cache.peek(key)
+
+
+def prefetch_profiles(symbols):
+    # Prime the per-symbol profile cache with comma-separated multi-symbol calls
+    ttl, stale_ttl = FMP_CACHE_TTLS["profile"]
+    missing = [s for s in dict.fromkeys(symbols) if fmp_cache.state(cache_key(f"profile/{s}", {})) != "fresh"]
+    chunks = [missing[i:i + FMP_PROFILE_BATCH_SIZE] for i in range(0, len(missing), FMP_PROFILE_BATCH_SIZE)]
+    futures = [submit(executor, fmp_get, f"profile/{','.join(chunk)}") for chunk in chunks]
+    for future in futures:
+        try:
+            response = future.result()
+            if response.status_code != 200:
+                continue
+            for item in response.json():
+                fmp_cache.set(cache_key(f"profile/{item.get('symbol')}", {}), [item], ttl, stale_ttl)
+        except Exception as e:
+            print("Profile Prefetch Error:", e)
+
+
+def prefetch_batch(symbols):
+    # Batch warm-up: profiles for every ticker in comma-separated calls, then the peer
+    # index for each distinct industry, built concurrently in the background. Tickers
+    # whose industry is still being built join that build (the index single-flights it);
+    # the others go ahead, so the batch starts streaming without waiting for every build.
+    prefetch_profiles(symbols)
+    industries = set()
+    for symbol in symbols:
+        profile = fmp_json(f"profile/{symbol}")
+        if profile and profile[0].get("industry"):
+            industries.add(profile[0]["industry"])
+    for industry in industries:
+        if industry_index.get(industry) is None:
+            submit(industry_executor, industry_index.peers, industry).add_done_callback(report_peer_prefetch)
+
+
+def report_peer_prefetch(future):
+    if future.exception() is not None:
+        print("Peer Prefetch Error:", future.exception())
+
+
+def fetch_statements(symbol, kind):
+    # Steps 3-4: statements from the local store, topped up from FMP when a refresh is due.
+    # If FMP fails, the stored periods are still served; with none stored there is no
+    # digest to build, and the request is answered as unavailable rather than empty.
+    limit = statement_store.plan(symbol, kind)
+    rows = None
+    if limit:
+        rows = inflight.do(("statements", symbol, kind, limit), lambda: fetch_json(f"{kind}/{symbol}", {"limit": limit}))
+        if rows is not None:
+            statement_store.merge(symbol, kind, rows, full=limit >= STORE_BACKFILL_YEARS)
+    stored = statement_store.read(symbol, kind, HISTORY_YEARS)
+    if limit and rows is None and not stored:
+        raise UpstreamUnavailable(f"fmp: no {kind} for {symbol}")
+    return stored
+
+
+def load_listing():
+    # Every listed symbol across exchanges, for the symbol index
+    return fetch_json("stock/list", {})
+
+
+symbol_index = SymbolIndex(load_listing, SYMBOL_INDEX_PATH, SYMBOL_INDEX_REFRESH_INTERVAL)
+symbol_index.start()
+
+
+def search_symbol(query):
+    # Step 1: Search ticker in the local index; FMP search only for what it cannot resolve
+    with stage("search"):
+        symbol = symbol_index.resolve(query)
+        if symbol:
+            return symbol
+        results = fmp_json("search", query=query, limit=1)
+        if results is None:
+            raise UpstreamUnavailable(f"fmp: search for {query!r} failed")
+        if not results:
+            return None
+        return results[0].get("symbol")
+
+
+def build_industry(industry):
+    # Step 5 for a whole industry: one screener call, comma-separated profile calls and
+    # every peer's latest income statement in parallel, largest market cap first
+    peer_data = fetch_json("stock-screener", {"industry": industry, "limit": PEER_INDEX_LIMIT})
+    if peer_data is None:
+        return None
+    symbols = list(dict.fromkeys(p.get("symbol") for p in peer_data if p.get("symbol")))
+    prefetch_profiles(symbols)
+    income_futures = [submit(executor, fmp_json, f"income-statement/{s}", limit=1) for s in symbols]
+    peers = []
+    for comp_symbol, income_future in zip(symbols, income_futures):
+        comp_profile = fmp_json(f"profile/{comp_symbol}")
+        comp_income = income_future.result()
+        if comp_profile and comp_income:
+            peers.append((comp_symbol, comp_profile[0], comp_income[0]))
+    return sorted(competitor_rows(peers), key=lambda row: row["marketCap"] or 0, reverse=True)
+
+
+industry_index = IndustryIndex(build_industry, PEER_INDEX_REFRESH_INTERVAL)
+if PEER_INDEX_INDUSTRIES:
+    industry_index.warm(PEER_INDEX_INDUSTRIES)
+
+# Counters for /metrics, read at scrape time
+register_cache(fmp_cache)
+register_upstream(fmp_upstream)
+register_stats("singleflight_calls_total", "Calls that led an upstream fetch or joined one in flight.", "flight", "fmp", inflight.stats)
+register_stats("singleflight_calls_total", "Calls that led an upstream fetch or joined one in flight.", "flight", "fmp_async", async_inflight.stats)
+register_stats("index_events_total", "Lookups and rebuilds of the in-memory indexes.", "index", "peers", industry_index.stats)
+register_stats("index_events_total", "Lookups and rebuilds of the in-memory indexes.", "index", "symbols", symbol_index.stats)
+
+
+def fetch_company(symbol):
+    # Steps 2-5: profile, income statement and cash flow are independent once the
+    # symbol is known; the peers come from the industry index once the profile's
+    # industry is known (an in-memory lookup unless the industry is new).
+    profile_future = submit(executor, timed("profile", fmp_json), f"profile/{symbol}")
+    income_future = submit(executor, timed("income_statement", fetch_statements), symbol, "income-statement")
+    cashflow_future = submit(executor, timed("cash_flow_statement", fetch_statements), symbol, "cash-flow-statement")
+
+    profile = profile_future.result()
+    if profile is None:
+        raise UpstreamUnavailable(f"fmp: no profile for {symbol}")
+    if not profile:
+        raise CompanyNotFound(symbol)
+    profile = profile[0]
+    industry = profile.get("industry", None)
+    with stage("peers"):
+        industry_peers = industry_index.peers(industry) if industry else []
+
+    return profile, income_future.result(), cashflow_future.result(), industry_peers
+
+
+def async_client():
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(
+            headers={"User-Agent": "Mozilla/5.0"},
+            timeout=httpx.Timeout(FMP_READ_TIMEOUT, connect=FMP_CONNECT_TIMEOUT, pool=None),
+            limits=httpx.Limits(max_connections=FMP_POOL_SIZE, max_keepalive_connections=FMP_POOL_SIZE),
+        )
+    return _async_client
+
+
+async def close_async_client():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+
+async def fmp_get_async(path, **params):
+    # Async counterpart of fmp_get(), sharing its policy
+    params["apikey"] = fmp_api_key
+
+    async def send(timeout):
+        try:
+            response = await async_client().get(
+                f"{FMP_BASE_URL}/{path}",
+                params=params,
+                timeout=httpx.Timeout(timeout, connect=min(FMP_CONNECT_TIMEOUT, timeout), pool=None),
+            )
+        except httpx.TransportError as e:
+            raise RetryableError(f"{path}: {type(e).__name__}") from e
+        return check_status(path, response)
+
+    return await fmp_upstream.call_async(send, endpoint=path.split("/")[0])
+
+
+async def fetch_json_async(path, params):
+    # Async counterpart of fetch_json()
+    try:
+        response = await fmp_get_async(path, **params)
+    except UpstreamUnavailable as e:
+        print("FMP Error:", e)
+        return None
+    return response.json() if response.status_code == 200 else None
+
+
+async def fmp_json_async(path, **params):
+    # Same cache and keys as fmp_json(); stale entries are refreshed on the thread pool
+    # so the event loop never blocks on an upstream call
+    async def fetch():
+        return await fetch_json_async(path, params)
+
+    ttl, stale_ttl = FMP_CACHE_TTLS.get(path.split("/")[0], (0, 0))
+    if not ttl:
+        return await fetch()
+    key = cache_key(path, params)
+    value, state = await fmp_cache.get_async(key)
+    if state == "fresh":
+        return value
+    if state == "stale":
+        def refresh():
+            return inflight.do(key, lambda: fetch_json(path, params))
+
+        fmp_cache.refresh_later(key, refresh, ttl, stale_ttl, executor)
+        return value
+    value = await async_inflight.do(key, fetch)
+    if value is not None:
+        await fmp_cache.set_async(key, value, ttl, stale_ttl)
+        return value
+    return await fmp_cache.peek_async(key)
+
+
+async def fetch_statements_async(symbol, kind):
+    # Async counterpart of fetch_statements(); the SQLite calls run off the event loop
+    limit = await run_in_store_thread(statement_store.plan, symbol, kind)
+    rows = None
+    if limit:
+        async def fetch():
+            return await fetch_json_async(f"{kind}/{symbol}", {"limit": limit})
+
+        rows = await async_inflight.do(("statements", symbol, kind, limit), fetch)
+        if rows is not None:
+            await run_in_store_thread(statement_store.merge, symbol, kind, rows, full=limit >= STORE_BACKFILL_YEARS)
+    stored = await run_in_store_thread(statement_store.read, symbol, kind, HISTORY_YEARS)
+    if limit and rows is None and not stored:
+        raise UpstreamUnavailable(f"fmp: no {kind} for {symbol}")
+    return stored
+
+
+async def search_symbol_async(query):
+    # Step 1: Search ticker, same lookup order as search_symbol()
+    with stage("search"):
+        symbol = symbol_index.resolve(query)
+        if symbol:
+            return symbol
+        results = await fmp_json_async("search", query=query, limit=1)
+        if results is None:
+            raise UpstreamUnavailable(f"fmp: search for {query!r} failed")
+        if not results:
+            return None
+        return results[0].get("symbol")
+
+
+async def fetch_company_async(symbol):
+    # Steps 2-5, same dependency chain as fetch_company()
+    profile_task = asyncio.ensure_future(timed("profile", fmp_json_async)(f"profile/{symbol}"))
+    income_task = asyncio.ensure_future(timed("income_statement", fetch_statements_async)(symbol, "income-statement"))
+    cashflow_task = asyncio.ensure_future(timed("cash_flow_statement", fetch_statements_async)(symbol, "cash-flow-statement"))
+
+    profile = await profile_task
+    if profile is None:
+        raise UpstreamUnavailable(f"fmp: no profile for {symbol}")
+    if not profile:
+        raise CompanyNotFound(symbol)
+    profile = profile[0]
+    industry = profile.get("industry", None)
+    industry_peers = []
+    if industry:
+        # A new industry is built on the peer build pool, off the event loop; known ones
+        # are a dict lookup
+        with stage("peers"):
+            industry_peers = industry_index.get(industry)
+            if industry_peers is None:
+                industry_peers = await asyncio.wrap_future(submit(industry_executor, industry_index.peers, industry))
+
+    return profile, await income_task, await cashflow_task, industry_peers
@@ -0,0 +1,22 @@
+import os
+
+# Production launch, replacing `python app.py` (Flask's debug server):
+#
+#     cd backend && gunicorn -c gunicorn.conf.py
+#
+# Serves the async app (asgi:app) on uvicorn workers by default. Set APP_MODULE=app:app
+# to serve the sync Flask app on threaded workers instead; both serve the same routes.
+
+bind = os.getenv("BIND", "0.0.0.0:5000")
+wsgi_app = os.getenv("APP_MODULE", "asgi:app")
+worker_class = "uvicorn.workers.UvicornWorker" if wsgi_app.startswith("asgi:") else "gthread"
+
+# Every worker has its own caches and connection pools, so prefer a few workers with
+# many concurrent requests each over many small workers
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+threads = int(os.getenv("THREADS", "32"))  # gthread workers only
+
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+accesslog = "-"
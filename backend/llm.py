@@ -0,0 +1,301 @@
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor, TimeoutError, as_completed
+import asyncio
+import hashlib
+import json
+import threading
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+import requests
+
+from config import (
+    gemini_api_key,
+    GEMINI_MODEL,
+    LLM_MAX_WORKERS,
+    LLM_CALL_TIMEOUT,
+    LLM_TOTAL_TIMEOUT,
+    LLM_CACHE_MAX_ENTRIES,
+    LLM_CACHE_TTL,
+    CACHE_DB_PATH,
+    GEMINI_API_ENDPOINT,
+    GEMINI_RATE_LIMIT,
+    GEMINI_RATE_BURST,
+    RETRY_LIMIT,
+    RETRY_BACKOFF_BASE,
+    RETRY_BACKOFF_MAX,
+    BREAKER_FAILURE_THRESHOLD,
+    BREAKER_RESET_TIMEOUT,
+)
+from cache import TTLCache
+from policy import RetryableError, Upstream, submit as submit_in_context
+from telemetry import register_cache, register_upstream
+
+# ✅ Configure Gemini correctly, once per process
+if GEMINI_API_ENDPOINT:
+    genai.configure(api_key=gemini_api_key, transport="rest", client_options={"api_endpoint": GEMINI_API_ENDPOINT})
+else:
+    genai.configure(api_key=gemini_api_key)
+model = genai.GenerativeModel(GEMINI_MODEL)
+
+# Shared by all requests, so the number of in-flight Gemini calls stays bounded
+executor = ThreadPoolExecutor(max_workers=LLM_MAX_WORKERS, thread_name_prefix="llm")
+# The same bound for the ASGI server's non-blocking calls
+_async_slots = asyncio.Semaphore(LLM_MAX_WORKERS)
+# Threads for the ASGI server's blocking REST calls, so they cannot fill asyncio's default pool
+rest_executor = ThreadPoolExecutor(max_workers=LLM_MAX_WORKERS, thread_name_prefix="llm-rest")
+
+# Rate limit, retries and circuit breaker for every Gemini call
+gemini_upstream = Upstream(
+    "gemini",
+    rate=GEMINI_RATE_LIMIT,
+    burst=GEMINI_RATE_BURST,
+    call_timeout=LLM_CALL_TIMEOUT,
+    max_retries=RETRY_LIMIT,
+    backoff_base=RETRY_BACKOFF_BASE,
+    backoff_max=RETRY_BACKOFF_MAX,
+    failure_threshold=BREAKER_FAILURE_THRESHOLD,
+    reset_timeout=BREAKER_RESET_TIMEOUT,
+)
+# Quota (429), server-side (5xx, deadline) and network errors are retried
+RETRYABLE_ERRORS = (google_exceptions.TooManyRequests, google_exceptions.ServerError, requests.RequestException, asyncio.TimeoutError)
+
+# Generated text per (symbol, model, task, prompt hash); the symbol prefix allows invalidation
+generation_cache = TTLCache("llm", LLM_CACHE_MAX_ENTRIES, db_path=CACHE_DB_PATH or None)
+_statement_periods = {}
+_statement_periods_lock = threading.Lock()
+# Generations in flight per cache key, shared by concurrent requests for the same symbol
+_inflight = {}
+_inflight_lock = threading.Lock()
+_inflight_async = {}
+
+# Counters for /metrics, read at scrape time
+register_cache(generation_cache)
+register_upstream(gemini_upstream)
+
+COMMENT_KEYS = "revenue, netIncome, grossMargins, profitMargins, peRatio, pbRatio"
+
+
+def extract_json(text):
+    # Remove Markdown code block formatting if present
+    if text.strip().startswith('```'):
+        text = text.strip().split('\n', 1)[-1]  # Remove the first line (```json or ```
+        if text.endswith('```'):
+            text = text.rsplit('```', 1)[0]
+    return text.strip()
+
+
+def request_options(timeout):
+    # Retries are left to gemini_upstream, so the library's own retry is turned off
+    return {"timeout": timeout, "retry": None}
+
+
+def generate(prompt):
+    def send(timeout):
+        try:
+            response = model.generate_content(prompt, request_options=request_options(timeout))
+        except RETRYABLE_ERRORS as e:
+            raise RetryableError(f"{type(e).__name__}: {e}") from e
+        return response.text.strip()
+
+    return gemini_upstream.call(send, endpoint="generate_content")
+
+
+def parse_comments(text):
+    # Valid JSON that is not an object (a list of sentences, say) is as unusable as
+    # invalid JSON: it goes through the repair retry and is never cached
+    comments = json.loads(extract_json(text))
+    if not isinstance(comments, dict):
+        raise ValueError(f"expected a JSON object, got {type(comments).__name__}")
+    return comments
+
+
+def comment_retry_prompt(text, json_err):
+    print("Comment Generation Error: Invalid JSON from Gemini:", text)
+    print("JSON decode error:", json_err)
+    # Retry: Ask Gemini to fix the output and return only valid JSON
+    return f"""
+The following is not valid JSON. Please correct it and return only valid JSON with keys: {COMMENT_KEYS}. Do not include any extra text.
+
+Original output:
+{text}
+"""
+
+
+def parse_retried_comments(retry_text):
+    try:
+        return parse_comments(retry_text)
+    except Exception as retry_json_err:
+        print("Retry Comment Generation Error: Invalid JSON from Gemini:", retry_text)
+        print("JSON decode error:", retry_json_err)
+        raise
+
+
+def generate_comments(prompt):
+    # The JSON-repair retry depends on the first answer, so it stays chained in the same task
+    text = generate(prompt)
+    try:
+        return parse_comments(text)
+    except Exception as json_err:
+        return parse_retried_comments(generate(comment_retry_prompt(text, json_err)))
+
+
+async def generate_async(prompt):
+    async def send(timeout):
+        async with _async_slots:
+            try:
+                if GEMINI_API_ENDPOINT:
+                    # The REST transport has no async client
+                    response = await asyncio.wrap_future(
+                        submit_in_context(rest_executor, model.generate_content, prompt, request_options=request_options(timeout))
+                    )
+                else:
+                    response = await model.generate_content_async(prompt, request_options=request_options(timeout))
+            except RETRYABLE_ERRORS as e:
+                raise RetryableError(f"{type(e).__name__}: {e}") from e
+        return response.text.strip()
+
+    return await gemini_upstream.call_async(send, endpoint="generate_content")
+
+
+async def generate_comments_async(prompt):
+    text = await generate_async(prompt)
+    try:
+        return parse_comments(text)
+    except Exception as json_err:
+        return parse_retried_comments(await generate_async(comment_retry_prompt(text, json_err)))
+
+
+def generation_key(symbol, task, prompt):
+    # Prompts are fully determined by their inputs, so hashing the whitespace-normalized
+    # prompt covers both the numbers and the template wording
+    normalized = " ".join(prompt.split())
+    digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+    return f"{symbol}:{GEMINI_MODEL}:{task}:{digest}"
+
+
+def follow(shared):
+    # A future of the caller's own that settles with ``shared``; cancelling it (as_ready()
+    # does on timeout) leaves the shared generation running for the other requests
+    future = Future()
+
+    def settle(done):
+        if not future.set_running_or_notify_cancel():
+            return
+        if done.cancelled():
+            future.set_exception(CancelledError())
+        elif done.exception() is not None:
+            future.set_exception(done.exception())
+        else:
+            future.set_result(done.result())
+
+    shared.add_done_callback(settle)
+    return future
+
+
+def submit(fn, prompt, symbol):
+    # Serve repeats from the generation cache and join a generation already in flight;
+    # only successful generations are stored
+    key = generation_key(symbol, fn.__name__, prompt)
+    value, state = generation_cache.get(key)
+    if state is not None:
+        future = Future()
+        future.set_result(value)
+        return future
+
+    def remember(done):
+        if not done.cancelled() and done.exception() is None:
+            generation_cache.set(key, done.result(), LLM_CACHE_TTL)
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+    with _inflight_lock:
+        shared = _inflight.get(key)
+        leader = shared is None
+        if leader:
+            shared = _inflight[key] = submit_in_context(executor, fn, prompt)
+    if leader:
+        shared.add_done_callback(remember)
+    return follow(shared)
+
+
+def submit_async(fn, prompt, symbol):
+    # Async counterpart of submit(); the sync and async generators share cache keys. Each
+    # caller awaits the shared generation through a shield, so as_ready_async() cancelling
+    # one request's task on timeout does not cancel it for the others.
+    key = generation_key(symbol, fn.__name__.removesuffix("_async"), prompt)
+
+    async def generate_and_remember():
+        result = await fn(prompt)
+        await generation_cache.set_async(key, result, LLM_CACHE_TTL)
+        return result
+
+    def forget(done):
+        _inflight_async.pop(key, None)
+        if not done.cancelled():
+            done.exception()  # mark retrieved when every caller has given up
+
+    async def run():
+        value, state = await generation_cache.get_async(key)
+        if state is not None:
+            return value
+        shared = _inflight_async.get(key)
+        if shared is None:
+            shared = _inflight_async[key] = asyncio.ensure_future(generate_and_remember())
+            shared.add_done_callback(forget)
+        return await asyncio.shield(shared)
+
+    return asyncio.ensure_future(run())
+
+
+def invalidate_generations(symbol):
+    return generation_cache.invalidate(lambda key: key.startswith(f"{symbol}:"))
+
+
+def note_statement_period(symbol, period):
+    # Drop a symbol's cached commentary once a newer statement period shows up
+    with _statement_periods_lock:
+        previous = _statement_periods.get(symbol)
+        _statement_periods[symbol] = period
+    if previous is not None and previous != period:
+        invalidate_generations(symbol)
+
+
+def as_ready(futures, timeout=LLM_TOTAL_TIMEOUT):
+    # Yield (name, result) as each generation finishes, all under one deadline: the request
+    # costs the slowest call, not the sum. A failed or timed-out generation yields None so
+    # callers can fill in a fallback.
+    pending = {future: name for name, future in futures.items()}
+    try:
+        for future in as_completed(list(pending), timeout=timeout):
+            name = pending.pop(future)
+            if future.exception() is not None:
+                print(f"{name} Generation Error:", future.exception())
+                yield name, None
+            else:
+                yield name, future.result()
+    except TimeoutError:
+        for future, name in pending.items():
+            future.cancel()
+            print(f"{name} Generation Error: timed out after {timeout}s")
+            yield name, None
+
+
+async def as_ready_async(tasks, timeout=LLM_TOTAL_TIMEOUT):
+    # Async counterpart of as_ready()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    pending = {task: name for name, task in tasks.items()}
+    while pending:
+        done, _ = await asyncio.wait(pending, timeout=max(deadline - loop.time(), 0), return_when=asyncio.FIRST_COMPLETED)
+        if not done:
+            break
+        for task in done:
+            name = pending.pop(task)
+            if task.exception() is not None:
+                print(f"{name} Generation Error:", task.exception())
+                yield name, None
+            else:
+                yield name, task.result()
+    for task, name in pending.items():
+        task.cancel()
+        print(f"{name} Generation Error: timed out after {timeout}s")
+        yield name, None
@@ -0,0 +1,126 @@
+import numpy as np
+
+# Columnar financial metrics. Statements are loaded into float arrays (oldest period
+# first, NaN for anything missing) and every derived series is computed with array
+# operations along the last axis, so the same functions work on one company's history
+# or across many tickers at once (one element per ticker, see competitor_rows).
+# Anything undefined, such as a margin on zero revenue, is NaN rather than an exception;
+# to_list() and scalar() turn NaN into None for JSON.
+
+INCOME_FIELDS = ("revenue", "netIncome", "grossProfit")
+CASHFLOW_FIELDS = ("operatingCashFlow", "cashflowFromInvestment", "cashflowFromFinancing", "capitalExpenditure")
+
+
+def _number(value):
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else np.nan
+
+
+def table(rows, fields):
+    # {field: array} with one element per row, in the given row order
+    return {field: np.array([_number(row.get(field)) for row in rows], dtype=float) for field in fields}
+
+
+def load(statements, fields):
+    # FMP returns statements newest first; series are oldest first
+    return table(statements[::-1], fields)
+
+
+def periods(statements):
+    return [s.get("calendarYear") for s in reversed(statements)]
+
+
+def ratio(numerator, denominator):
+    numerator, denominator = np.broadcast_arrays(np.asarray(numerator, dtype=float), np.asarray(denominator, dtype=float))
+    out = np.full(numerator.shape, np.nan)
+    np.divide(numerator, denominator, out=out, where=(denominator != 0) & ~np.isnan(denominator))
+    return out
+
+
+def yoy_growth(series):
+    # (current - previous) / previous for each period; the first period has no growth
+    series = np.asarray(series, dtype=float)
+    growth = np.full(series.shape, np.nan)
+    growth[..., 1:] = ratio(series[..., 1:] - series[..., :-1], series[..., :-1])
+    return growth
+
+
+def cagr(series):
+    # Compound annual growth from the first to the last period; NaN unless both are positive
+    series = np.asarray(series, dtype=float)
+    if series.shape[-1] < 2:
+        return np.full(series.shape[:-1], np.nan)
+    first, last = series[..., 0], series[..., -1]
+    valid = (first > 0) & (last > 0)
+    out = np.full(first.shape, np.nan)
+    np.power(ratio(last, first), 1.0 / (series.shape[-1] - 1), out=out, where=valid)
+    return out - 1
+
+
+def shares(values):
+    # Percentage of the total along the last axis; NaN when the total is not positive
+    values = np.asarray(values, dtype=float)
+    total = np.nansum(values, axis=-1, keepdims=True)
+    return np.where(total > 0, ratio(values, total) * 100, np.nan)
+
+
+def ranks(values):
+    # 1 for the largest value along the last axis; NaN values are not ranked
+    values = np.asarray(values, dtype=float)
+    order = np.argsort(np.where(np.isnan(values), np.inf, -values), axis=-1, kind="stable")
+    out = np.empty(values.shape)
+    np.put_along_axis(out, order, np.arange(1, values.shape[-1] + 1, dtype=float) * np.ones(values.shape), axis=-1)
+    return np.where(np.isnan(values), np.nan, out)
+
+
+def rank_of(values, index=0):
+    # Rank of one entry among 1-D values, as an int for JSON
+    rank = ranks(values)[index]
+    return None if np.isnan(rank) else int(rank)
+
+
+def cash_flow_ratios(cash):
+    # Free cash flow and the share of operating cash flow reinvested as capex; a period
+    # with missing capex has no free cash flow rather than one equal to operating cash flow
+    operating = cash["operatingCashFlow"]
+    capex = cash["capitalExpenditure"]
+    return {
+        "freeCashFlow": operating + capex,
+        "capexToOperating": ratio(-capex, operating),
+    }
+
+
+def latest(series):
+    series = np.asarray(series, dtype=float)
+    return series[..., -1] if series.shape[-1] else np.full(series.shape[:-1], np.nan)
+
+
+def to_list(array, digits=None):
+    array = np.asarray(array, dtype=float)
+    if digits is not None:
+        array = np.round(array, digits)
+    return np.where(np.isnan(array), None, array).tolist()
+
+
+def scalar(value, default=None):
+    value = float(value)
+    return default if np.isnan(value) else value
+
+
+def competitor_rows(peers):
+    # (symbol, profile, latest income statement) per peer -> the industryInsights rows,
+    # with every peer's margins computed in one pass
+    income = table([peer_income for _, _, peer_income in peers], INCOME_FIELDS)
+    gross_margins = ratio(income["grossProfit"], income["revenue"])
+    profit_margins = ratio(income["netIncome"], income["revenue"])
+    return [
+        {
+            "symbol": symbol,
+            "company": profile.get("companyName", symbol),
+            "revenue": peer_income.get("revenue", 0),
+            "netIncome": peer_income.get("netIncome", 0),
+            "grossMargins": scalar(gross_margins[i]),
+            "profitMargins": scalar(profit_margins[i]),
+            "marketCap": profile.get("mktCap", 0)
+        }
+        for i, (symbol, profile, peer_income) in enumerate(peers)
+    ]
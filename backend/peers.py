@@ -0,0 +1,74 @@
+import threading
+import time
+
+from singleflight import SingleFlight
+
+
+class IndustryIndex:
+    """In-memory map of industry -> precomputed peer metrics.
+
+    ``build(industry)`` returns the peer rows for one industry, or None on failure. An
+    industry is built the first time it is asked for (concurrent first requests share
+    one build) and every known industry is then rebuilt in the background every
+    ``refresh_interval`` seconds, so requests only ever do a dict lookup.
+    """
+
+    def __init__(self, build, refresh_interval):
+        self.refresh_interval = refresh_interval
+        self.stats = {"lookups": 0, "builds": 0, "build_errors": 0}
+        self._build = build
+        self._industries = {}  # industry -> (rows, built_at)
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self._refresher = None
+
+    def get(self, industry):
+        entry = self._industries.get(industry)
+        return entry[0] if entry else None
+
+    def peers(self, industry):
+        self.stats["lookups"] += 1
+        rows = self.get(industry)
+        if rows is None:
+            rows = self._flight.do(industry, lambda: self.rebuild(industry))
+        self._start_refresher()
+        return rows or []
+
+    def rebuild(self, industry):
+        # Keeps the previous rows when a rebuild fails
+        self.stats["builds"] += 1
+        rows = self._build(industry)
+        if rows is None:
+            self.stats["build_errors"] += 1
+            return self.get(industry)
+        with self._lock:
+            self._industries[industry] = (rows, time.time())
+        return rows
+
+    def warm(self, industries):
+        # Build a list of industries in the background, e.g. at startup
+        def build_all():
+            for industry in industries:
+                try:
+                    self.peers(industry)
+                except Exception as e:
+                    print("Peer Index Build Error:", e)
+
+        threading.Thread(target=build_all, name="peer-index-warm", daemon=True).start()
+
+    def _start_refresher(self):
+        with self._lock:
+            if self._refresher is not None:
+                return
+            self._refresher = threading.Thread(target=self._refresh_loop, name="peer-index", daemon=True)
+        self._refresher.start()
+
+    def _refresh_loop(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            for industry in list(self._industries):
+                try:
+                    self.rebuild(industry)
+                except Exception as e:
+                    self.stats["build_errors"] += 1
+                    print("Peer Index Refresh Error:", e)
@@ -0,0 +1,225 @@
+import asyncio
+import contextlib
+import contextvars
+import random
+import threading
+import time
+
+from telemetry import upstream_seconds, upstream_wait_seconds
+
+# Client policy shared by every call to one upstream (FMP, Gemini): a token-bucket rate
+# limit, jittered exponential backoff on retryable failures, per-call timeouts cut to
+# what is left of the request's budget, and a circuit breaker that fails fast while the
+# upstream is down so callers can fall back to cached or partial data.
+
+# Monotonic deadline of the request being served, set with request_budget()
+_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+
+class RetryableError(Exception):
+    """Raised by a send function for failures worth retrying (429, 5xx, timeouts)."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class UpstreamUnavailable(Exception):
+    """The call was not made or gave up: circuit open, budget spent or retries exhausted."""
+
+
+@contextlib.contextmanager
+def request_budget(seconds):
+    # Every upstream call made in this context (including executor jobs submitted with
+    # the context copied) gets at most what is left of ``seconds``
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        try:
+            _deadline.reset(token)
+        except ValueError:
+            pass  # an abandoned stream closed from another context; nothing to restore there
+
+
+def remaining_budget():
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def retry_after(header):
+    # Retry-After in seconds; the HTTP-date form is ignored
+    try:
+        return float(header) if header else None
+    except ValueError:
+        return None
+
+
+def submit(executor, fn, *args, **kwargs):
+    # executor.submit() that keeps the caller's request budget in the worker thread
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait=None):
+        # Takes a token and returns how long to wait before using it, or None (taking
+        # nothing) when that would be longer than max_wait
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+            if max_wait is not None and wait > max_wait:
+                return None
+            self._tokens -= 1
+            return wait
+
+
+class CircuitBreaker:
+    # closed -> open after failure_threshold consecutive failures; open -> half-open after
+    # reset_timeout, letting one probe call through; the probe's outcome closes or reopens it
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = "half-open"
+                return True
+            return False
+
+    def release(self):
+        # Gives back an allow() that was not used: a half-open probe that never went out
+        # leaves the breaker open, ready to let the next call probe
+        with self._lock:
+            if self.state == "half-open":
+                self.state = "open"
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == "half-open" or self._failures >= self.failure_threshold:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+
+class Upstream:
+    """Rate limit, retries, deadlines and circuit breaker for one upstream service.
+
+    ``call(send, endpoint)`` runs ``send(timeout)``, which returns the result or raises
+    RetryableError for failures worth another attempt; any other exception is passed
+    through untouched. Each attempt is timed under ``endpoint``. UpstreamUnavailable is raised when the call cannot be made or
+    every attempt failed.
+    """
+
+    def __init__(self, name, rate, burst, call_timeout, max_retries, backoff_base, backoff_max,
+                 failure_threshold, reset_timeout):
+        self.name = name
+        self.call_timeout = call_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.stats = {"calls": 0, "retries": 0, "failures": 0, "short_circuits": 0, "throttled": 0}
+
+    def call(self, send, endpoint=""):
+        attempt = 0
+        while True:
+            wait, timeout = self._admit()
+            if wait:
+                time.sleep(wait)
+            started = time.perf_counter()
+            try:
+                result = send(timeout)
+            except RetryableError as e:
+                upstream_seconds.observe(time.perf_counter() - started, self.name, endpoint, "retryable_error")
+                attempt += 1
+                time.sleep(self._backoff(attempt, e))
+                continue
+            except Exception:
+                # The upstream answered; the error is about this request, not its health
+                upstream_seconds.observe(time.perf_counter() - started, self.name, endpoint, "error")
+                self.breaker.record_success()
+                raise
+            upstream_seconds.observe(time.perf_counter() - started, self.name, endpoint, "ok")
+            self.breaker.record_success()
+            return result
+
+    async def call_async(self, send, endpoint=""):
+        # Same policy for ``async def send(timeout)``
+        attempt = 0
+        while True:
+            wait, timeout = self._admit()
+            if wait:
+                await asyncio.sleep(wait)
+            started = time.perf_counter()
+            try:
+                result = await send(timeout)
+            except RetryableError as e:
+                upstream_seconds.observe(time.perf_counter() - started, self.name, endpoint, "retryable_error")
+                attempt += 1
+                await asyncio.sleep(self._backoff(attempt, e))
+                continue
+            except Exception:
+                # The upstream answered; the error is about this request, not its health
+                upstream_seconds.observe(time.perf_counter() - started, self.name, endpoint, "error")
+                self.breaker.record_success()
+                raise
+            upstream_seconds.observe(time.perf_counter() - started, self.name, endpoint, "ok")
+            self.breaker.record_success()
+            return result
+
+    def _admit(self):
+        # (rate limit wait, timeout) for the next attempt, or UpstreamUnavailable. The
+        # breaker is asked before the bucket, so calls failed fast while it is open take no
+        # tokens; a half-open probe refused by the bucket is handed back to the breaker.
+        remaining = remaining_budget()
+        if remaining is not None and remaining <= 0:
+            raise UpstreamUnavailable(f"{self.name}: request budget spent")
+        if not self.breaker.allow():
+            self.stats["short_circuits"] += 1
+            raise UpstreamUnavailable(f"{self.name}: circuit open")
+        wait = self.bucket.reserve(max_wait=remaining)
+        if wait is None:
+            self.breaker.release()
+            self.stats["throttled"] += 1
+            raise UpstreamUnavailable(f"{self.name}: rate limit wait exceeds request budget")
+        self.stats["calls"] += 1
+        if wait:
+            upstream_wait_seconds.observe(wait, self.name, "rate_limit")
+        timeout = self.call_timeout if remaining is None else min(self.call_timeout, remaining - wait)
+        return wait, max(timeout, 0.001)
+
+    def _backoff(self, attempt, error):
+        # Full jitter, but never sooner than the upstream's Retry-After
+        self.breaker.record_failure()
+        self.stats["failures"] += 1
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+        if error.retry_after is not None:
+            delay = max(delay, error.retry_after)
+        remaining = remaining_budget()
+        if attempt > self.max_retries or (remaining is not None and delay >= remaining):
+            raise UpstreamUnavailable(f"{self.name}: {error}") from error
+        self.stats["retries"] += 1
+        upstream_wait_seconds.observe(delay, self.name, "backoff")
+        return delay
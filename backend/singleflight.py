@@ -0,0 +1,71 @@
+from concurrent.futures import Future
+import asyncio
+import threading
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into one execution.
+
+    The first caller for a key (the leader) runs ``fn``; callers arriving while it is
+    in flight wait for the leader's result, or re-raise the leader's exception.
+    """
+
+    def __init__(self):
+        self.stats = {"leaders": 0, "coalesced": 0}
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self.stats["leaders"] += 1
+            else:
+                self.stats["coalesced"] += 1
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class AsyncSingleFlight:
+    """asyncio counterpart of SingleFlight for the ASGI server; use within one event loop.
+
+    ``fn()`` runs in a task of its own that every caller, the first one included, awaits
+    through a shield: a caller that is cancelled (a client disconnecting) leaves the call
+    running for the others.
+    """
+
+    def __init__(self):
+        self.stats = {"leaders": 0, "coalesced": 0}
+        self._calls = {}
+
+    async def do(self, key, fn):
+        task = self._calls.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+        else:
+            self.stats["leaders"] += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._done(key, done))
+        return await asyncio.shield(task)
+
+    def _done(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # mark retrieved when every caller has gone
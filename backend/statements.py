@@ -0,0 +1,75 @@
+import json
+import sqlite3
+import threading
+import time
+
+
+class StatementStore:
+    """Fundamentals per symbol, statement kind and period, kept in SQLite.
+
+    The store is filled incrementally: an empty symbol is backfilled once with a deep
+    history, after that only the newest few periods are fetched when a check is due,
+    and the whole history is re-fetched on a slower schedule to pick up restatements.
+    Callers ask plan() how many periods to fetch (None when the store is current),
+    hand the FMP rows to merge() and always read() from the store.
+    """
+
+    def __init__(self, db_path, backfill, incremental, check_interval, full_refresh_interval):
+        self.backfill = backfill
+        self.incremental = incremental
+        self.check_interval = check_interval
+        self.full_refresh_interval = full_refresh_interval
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS statements ("
+            "symbol TEXT, kind TEXT, period TEXT, payload TEXT, PRIMARY KEY (symbol, kind, period));"
+            "CREATE TABLE IF NOT EXISTS refreshes ("
+            "symbol TEXT, kind TEXT, checked_at REAL, full_refresh_at REAL, PRIMARY KEY (symbol, kind));"
+        )
+        self._db.commit()
+
+    def plan(self, symbol, kind):
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT checked_at, full_refresh_at FROM refreshes WHERE symbol = ? AND kind = ?",
+                (symbol, kind),
+            ).fetchone()
+        if row is None or now - row[1] >= self.full_refresh_interval:
+            return self.backfill
+        if now - row[0] >= self.check_interval:
+            return self.incremental
+        return None
+
+    def merge(self, symbol, kind, rows, full):
+        # Upserts every fetched period and returns how many were not stored before
+        now = time.time()
+        with self._lock:
+            known = {r[0] for r in self._db.execute(
+                "SELECT period FROM statements WHERE symbol = ? AND kind = ?", (symbol, kind)
+            )}
+            periods = [(str(r.get("date") or r.get("calendarYear")), r) for r in rows]
+            self._db.executemany(
+                "INSERT OR REPLACE INTO statements VALUES (?, ?, ?, ?)",
+                [(symbol, kind, period, json.dumps(r)) for period, r in periods],
+            )
+            previous = self._db.execute(
+                "SELECT full_refresh_at FROM refreshes WHERE symbol = ? AND kind = ?", (symbol, kind)
+            ).fetchone()
+            full_refresh_at = now if full or previous is None else previous[0]
+            self._db.execute(
+                "INSERT OR REPLACE INTO refreshes VALUES (?, ?, ?, ?)",
+                (symbol, kind, now, full_refresh_at),
+            )
+            self._db.commit()
+        return len({period for period, _ in periods} - known)
+
+    def read(self, symbol, kind, limit):
+        # Newest first, like the FMP endpoints
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT payload FROM statements WHERE symbol = ? AND kind = ? ORDER BY period DESC LIMIT ?",
+                (symbol, kind, limit),
+            ).fetchall()
+        return [json.loads(r[0]) for r in rows]
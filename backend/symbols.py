@@ -0,0 +1,208 @@
+import bisect
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import Counter
+
+# Words that do not help tell companies apart ("Apple Inc." and "apple" should match exactly)
+NAME_SUFFIXES = {
+    "inc", "incorporated", "corp", "corporation", "co", "company", "ltd", "limited", "plc",
+    "llc", "lp", "sa", "ag", "nv", "se", "the", "holdings", "group", "class",
+}
+# Tie-breaker between equally good matches: primary US listings first
+EXCHANGE_PRIORITY = {"NASDAQ": 0, "NYSE": 0, "AMEX": 1}
+MIN_FUZZY_SCORE = 0.35
+
+
+def normalize(text):
+    words = re.sub(r"[^a-z0-9 ]+", " ", (text or "").lower()).split()
+    return " ".join(w for w in words if w not in NAME_SUFFIXES) or " ".join(words)
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SymbolIndex:
+    """In-memory ticker resolution over a listing snapshot.
+
+    ``load()`` returns the listing as FMP ``stock/list`` rows (symbol, name,
+    exchangeShortName, ...), or None on failure. The last good listing is kept in a JSON
+    snapshot so a restart can answer immediately; it is reloaded in the background every
+    ``refresh_interval`` seconds. Lookups try the exact symbol, then symbol and name
+    prefixes, then trigram similarity on the name, so typos still find candidates.
+    """
+
+    def __init__(self, load, snapshot_path, refresh_interval):
+        self.snapshot_path = snapshot_path
+        self.refresh_interval = refresh_interval
+        self.loaded_at = None
+        self.stats = {"lookups": 0, "misses": 0, "loads": 0, "load_errors": 0}
+        self._load = load
+        self._index = None
+        self._refresher = None
+        self._lock = threading.Lock()
+
+    def ready(self):
+        return self._index is not None
+
+    def size(self):
+        return len(self._index["entries"]) if self._index else 0
+
+    def build(self, rows):
+        # Builds the lookup tables off to the side and swaps them in with one assignment,
+        # so readers never see a half-built index
+        entries = []
+        seen = set()
+        for row in rows:
+            symbol = (row.get("symbol") or "").upper()
+            if not symbol or symbol in seen:
+                continue
+            seen.add(symbol)
+            entries.append({
+                "symbol": symbol,
+                "name": row.get("name") or symbol,
+                "exchange": row.get("exchangeShortName") or row.get("exchange"),
+            })
+        names = [normalize(e["name"]) for e in entries]
+        grams = {}
+        gram_counts = []
+        for i, name in enumerate(names):
+            name_grams = trigrams(name)
+            gram_counts.append(len(name_grams))
+            for gram in name_grams:
+                grams.setdefault(gram, []).append(i)
+        self._index = {
+            "entries": entries,
+            "names": names,
+            "by_symbol": {e["symbol"]: i for i, e in enumerate(entries)},
+            "symbols_sorted": sorted((e["symbol"], i) for i, e in enumerate(entries)),
+            "names_sorted": sorted((name, i) for i, name in enumerate(names)),
+            "grams": grams,
+            "gram_counts": gram_counts,
+        }
+        self.loaded_at = time.time()
+
+    def search(self, query, limit=8):
+        # Ranked candidates: [{"symbol", "name", "exchange", "score"}], best first
+        index = self._index
+        self.stats["lookups"] += 1
+        if index is None or not (query or "").strip():
+            return []
+        symbol_query = query.strip().upper()
+        name_query = normalize(query)
+        scores = {}
+
+        def consider(i, score):
+            if score > scores.get(i, 0):
+                scores[i] = score
+
+        # An all upper case query ("F", "IBM") is most likely a ticker; anything else
+        # ("Ford", "apple") is most likely a name, so names whose first words match it
+        # outrank a ticker that happens to be spelled the same (FORD)
+        ticker_shaped = query.strip().isupper()
+        exact = index["by_symbol"].get(symbol_query)
+        if exact is not None:
+            consider(exact, 1.0 if ticker_shaped else 0.9)
+        for i in self._prefixed(index["names_sorted"], name_query, limit * 4):
+            name = index["names"][i]
+            if name == name_query:
+                consider(i, 0.95 if ticker_shaped else 1.0)
+            elif not ticker_shaped and name.startswith(name_query + " "):
+                consider(i, 0.9 + 0.05 * len(name_query) / len(name))
+            else:
+                consider(i, 0.8 + 0.1 * len(name_query) / len(name))
+        for i in self._prefixed(index["symbols_sorted"], symbol_query, limit * 4):
+            consider(i, 0.8 + 0.1 * len(symbol_query) / len(index["entries"][i]["symbol"]))
+
+        if len(scores) < limit and name_query:
+            # Dice similarity over name trigrams, counted from the posting lists
+            query_grams = trigrams(name_query)
+            overlap = Counter()
+            for gram in query_grams:
+                overlap.update(index["grams"].get(gram, ()))
+            for i, shared in overlap.most_common(limit * 20):
+                score = 0.75 * 2 * shared / (len(query_grams) + index["gram_counts"][i])
+                if score >= MIN_FUZZY_SCORE:
+                    consider(i, score)
+
+        entries = index["entries"]
+        ranked = sorted(
+            scores.items(),
+            key=lambda item: (-item[1], EXCHANGE_PRIORITY.get(entries[item[0]]["exchange"], 2), len(entries[item[0]]["name"])),
+        )
+        return [{**entries[i], "score": round(score, 3)} for i, score in ranked[:limit]]
+
+    def resolve(self, query):
+        # Only the exact symbol or name, or a name that starts with the query's whole words
+        # ("ford" -> Ford Motor Co), is trusted; partial words ("AAP", "micro") and typos
+        # are left to FMP search rather than analysing a look-alike company
+        candidates = self.search(query, limit=1)
+        if not candidates or not self._matches_whole(query, candidates[0]):
+            self.stats["misses"] += 1
+            return None
+        return candidates[0]["symbol"]
+
+    def start(self):
+        # Serve the snapshot right away, then reload from the source in the background
+        if self.snapshot_path and os.path.exists(self.snapshot_path):
+            try:
+                with open(self.snapshot_path) as f:
+                    self.build(json.load(f))
+                self.loaded_at = os.path.getmtime(self.snapshot_path)
+            except Exception as e:
+                print("Symbol Snapshot Error:", e)
+        with self._lock:
+            if self._refresher is not None:
+                return
+            self._refresher = threading.Thread(target=self._refresh_loop, name="symbol-index", daemon=True)
+        self._refresher.start()
+
+    def reload(self):
+        self.stats["loads"] += 1
+        rows = self._load()
+        if not rows:
+            self.stats["load_errors"] += 1
+            return False
+        self.build(rows)
+        if self.snapshot_path:
+            # Every worker process refreshes the same snapshot, so each writes its own
+            # temporary file and the last rename wins
+            with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(self.snapshot_path) or ".", suffix=".tmp", delete=False) as f:
+                json.dump(rows, f)
+            os.replace(f.name, self.snapshot_path)
+        return True
+
+    @staticmethod
+    def _matches_whole(query, candidate):
+        name_query = normalize(query)
+        name = normalize(candidate["name"])
+        return candidate["symbol"] == query.strip().upper() or name == name_query or name.startswith(name_query + " ")
+
+    def _prefixed(self, sorted_keys, prefix, limit):
+        if not prefix:
+            return []
+        found = []
+        position = bisect.bisect_left(sorted_keys, (prefix,))
+        while position < len(sorted_keys) and len(found) < limit:
+            key, i = sorted_keys[position]
+            if not key.startswith(prefix):
+                break
+            found.append(i)
+            position += 1
+        return found
+
+    def _refresh_loop(self):
+        while True:
+            if self.loaded_at is None or time.time() - self.loaded_at >= self.refresh_interval:
+                try:
+                    self.reload()
+                except Exception as e:
+                    self.stats["load_errors"] += 1
+                    print("Symbol Index Refresh Error:", e)
+            # Retry a failed first load sooner than a full interval
+            time.sleep(self.refresh_interval if self._index else min(self.refresh_interval, 60))
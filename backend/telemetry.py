@@ -0,0 +1,200 @@
+import contextlib
+import contextvars
+import functools
+import inspect
+import json
+import threading
+import time
+import uuid
+
+from config import TRACE_EXPORT_PATH
+
+# Latency histograms and counters for the /analyze pipeline, rendered in the Prometheus
+# text format on /metrics. Every request runs in a request_scope() with an ID; stage()
+# times one step of it (an upstream call, a compute step, a Gemini prompt), feeding the
+# histograms and, when TRACE_EXPORT_PATH is set, a JSON-lines trace of the request.
+# Metrics are per process: with several gunicorn workers, scrape each one.
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# The request being served: {"id", "endpoint", "status", "spans"}
+_request = contextvars.ContextVar("request", default=None)
+_trace_lock = threading.Lock()
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames, buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series = {}  # label values -> [bucket counts..., count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.setdefault(labels, [0] * (len(self.buckets) + 1) + [0.0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labels, values in sorted(series.items()):
+            pairs = list(zip(self.labelnames, labels))
+            for bound, count in zip(self.buckets, values):
+                lines.append(f"{self.name}_bucket{_labels(pairs + [('le', bound)])} {count}")
+            lines.append(f"{self.name}_bucket{_labels(pairs + [('le', '+Inf')])} {values[-2]}")
+            lines.append(f"{self.name}_count{_labels(pairs)} {values[-2]}")
+            lines.append(f"{self.name}_sum{_labels(pairs)} {values[-1]}")
+        return lines
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+request_seconds = Histogram("digest_request_seconds", "End-to-end latency of digest requests.", ("endpoint", "status"))
+stage_seconds = Histogram("digest_stage_seconds", "Latency of each digest pipeline stage.", ("stage", "outcome"))
+upstream_seconds = Histogram("upstream_call_seconds", "Latency of each upstream attempt.", ("upstream", "endpoint", "outcome"))
+upstream_wait_seconds = Histogram("upstream_wait_seconds", "Time spent waiting before an upstream attempt.", ("upstream", "reason"))
+
+# name -> (type, help, [collect]) where each collect() returns [(labels dict, value)]
+_collectors = {}
+CIRCUIT_STATES = {"closed": 0, "half-open": 1, "open": 2}
+
+
+def register(name, kind, help, collect):
+    # Values read at scrape time, e.g. cache stats or circuit breaker state
+    _collectors.setdefault(name, (kind, help, []))[2].append(collect)
+
+
+def register_stats(name, help, label, value, stats):
+    # A component's stats dict ({"hits": 3, ...}) as counters labelled with event=<key>
+    register(name, "counter", help, lambda: [({label: value, "event": event}, count) for event, count in list(stats.items())])
+
+
+def register_cache(cache):
+    register_stats("cache_events_total", "Cache lookups and evictions by result.", "cache", cache.name, cache.stats)
+    register("cache_hit_ratio", "gauge", "Share of cache lookups served from cache.", lambda: [({"cache": cache.name}, cache.hit_rate())])
+
+
+def register_upstream(upstream):
+    register_stats("upstream_events_total", "Upstream calls, retries, failures and fail-fast rejections.", "upstream", upstream.name, upstream.stats)
+    register(
+        "upstream_circuit_state", "gauge", "Circuit breaker state: 0 closed, 1 half-open, 2 open.",
+        lambda: [({"upstream": upstream.name}, CIRCUIT_STATES[upstream.breaker.state])],
+    )
+
+
+def render():
+    lines = []
+    for histogram in (request_seconds, stage_seconds, upstream_seconds, upstream_wait_seconds):
+        lines += histogram.render()
+    for name, (kind, help, collectors) in _collectors.items():
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+        for collect in collectors:
+            try:
+                for labels, value in collect():
+                    lines.append(f"{name}{_labels(list(labels.items()))} {value}")
+            except Exception as e:
+                print(f"Metrics Collector Error ({name}):", e)
+    return "\n".join(lines) + "\n"
+
+
+def new_request_id(header=None):
+    # Keep a caller-supplied X-Request-ID if it is sane, so traces join up across services
+    if header and len(header) <= 128 and header.isprintable():
+        return header
+    return uuid.uuid4().hex
+
+
+def current_request_id():
+    scope = _request.get()
+    return scope["id"] if scope else None
+
+
+@contextlib.contextmanager
+def request_scope(endpoint, request_id):
+    # Set scope["status"] inside the block; it labels the request histogram
+    scope = {"id": request_id, "endpoint": endpoint, "status": 200, "start": time.time(), "spans": []}
+    token = _request.set(scope)
+    started = time.perf_counter()
+    try:
+        yield scope
+    except Exception:
+        scope["status"] = 500
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        request_seconds.observe(seconds, endpoint, str(scope["status"]))
+        try:
+            _request.reset(token)
+        except ValueError:
+            pass  # an abandoned stream closed from another context; nothing to restore there
+        if TRACE_EXPORT_PATH:
+            export_trace(scope, seconds)
+
+
+@contextlib.contextmanager
+def stage(name, **attributes):
+    # Times one step; an exception marks it as an error and propagates
+    started = time.perf_counter()
+    start = time.time()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        stage_seconds.observe(seconds, name, outcome)
+        scope = _request.get()
+        if scope is not None:
+            scope["spans"].append({"stage": name, "start": start, "seconds": round(seconds, 6), "outcome": outcome, **attributes})
+
+
+def timed(name, fn):
+    # fn wrapped in stage(name), keeping its __name__ (generation cache keys use it)
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def run_async(*args, **kwargs):
+            with stage(name):
+                return await fn(*args, **kwargs)
+
+        return run_async
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        with stage(name):
+            return fn(*args, **kwargs)
+
+    return run
+
+
+def export_trace(scope, seconds):
+    # One JSON line per request; "-" prints to stdout
+    line = json.dumps({
+        "request_id": scope["id"],
+        "endpoint": scope["endpoint"],
+        "status": scope["status"],
+        "start": scope["start"],
+        "seconds": round(seconds, 6),
+        "spans": sorted(scope["spans"], key=lambda span: span["start"]),
+    })
+    try:
+        if TRACE_EXPORT_PATH == "-":
+            print(line)
+            return
+        with _trace_lock, open(TRACE_EXPORT_PATH, "a") as f:
+            f.write(line + "\n")
+    except Exception as e:
+        print("Trace Export Error:", e)
@@ -0,0 +1,63 @@
+import numpy as np
+
+import metrics
+
+nan = np.nan
+
+
+def test_ratio_is_nan_for_zero_or_missing_denominators():
+    out = metrics.ratio([1.0, 2.0, 3.0, nan], [2.0, 0.0, nan, 4.0])
+    assert out[0] == 0.5
+    assert np.isnan(out[1:]).all()
+
+
+def test_ratio_broadcasts_a_scalar():
+    np.testing.assert_allclose(metrics.ratio([2.0, 4.0], 2.0), [1.0, 2.0])
+
+
+def test_yoy_growth_has_no_first_period_and_skips_zero_bases():
+    out = metrics.yoy_growth([100.0, 110.0, 0.0, 50.0, nan])
+    assert np.isnan(out[0])
+    assert out[1] == 0.1
+    assert out[2] == -1.0
+    assert np.isnan(out[3])  # from zero
+    assert np.isnan(out[4])
+
+
+def test_yoy_growth_along_the_last_axis():
+    out = metrics.yoy_growth([[1.0, 2.0], [4.0, 2.0]])
+    np.testing.assert_allclose(out[:, 1], [1.0, -0.5])
+    assert np.isnan(out[:, 0]).all()
+
+
+def test_cagr():
+    assert np.isclose(metrics.cagr([100.0, 110.0, 121.0]), 0.1)
+
+
+def test_cagr_is_nan_unless_both_ends_are_positive():
+    assert np.isnan(metrics.cagr([0.0, 10.0]))
+    assert np.isnan(metrics.cagr([10.0, -5.0]))
+    assert np.isnan(metrics.cagr([nan, 10.0]))
+    assert np.isnan(metrics.cagr([10.0]))
+    np.testing.assert_allclose(metrics.cagr([[1.0, 4.0], [-1.0, 4.0]]), [3.0, nan])
+
+
+def test_ranks_largest_first_and_leaves_nan_unranked():
+    out = metrics.ranks([5.0, nan, 9.0, 1.0])
+    np.testing.assert_array_equal(out, [2.0, nan, 1.0, 3.0])
+    assert metrics.rank_of([5.0, nan, 9.0]) == 2
+    assert metrics.rank_of([nan, 1.0]) is None
+
+
+def test_free_cash_flow_is_nan_without_capex():
+    cash = metrics.load(
+        [{"operatingCashFlow": 100, "capitalExpenditure": -30}, {"operatingCashFlow": 80}],
+        metrics.CASHFLOW_FIELDS,
+    )
+    assert metrics.to_list(metrics.cash_flow_ratios(cash)["freeCashFlow"]) == [None, 70.0]
+
+
+def test_to_list_and_scalar_turn_nan_into_none():
+    assert metrics.to_list([1.234, nan], digits=1) == [1.2, None]
+    assert metrics.scalar(nan) is None
+    assert metrics.scalar(nan, default=0) == 0
@@ -0,0 +1,114 @@
+import time
+
+import pytest
+
+from policy import CircuitBreaker, RetryableError, TokenBucket, Upstream, UpstreamUnavailable, request_budget
+
+
+def upstream(rate=1000, burst=1000, failure_threshold=2, reset_timeout=60, max_retries=0):
+    return Upstream("test", rate=rate, burst=burst, call_timeout=5, max_retries=max_retries, backoff_base=0,
+                    backoff_max=0, failure_threshold=failure_threshold, reset_timeout=reset_timeout)
+
+
+def failing(timeout):
+    raise RetryableError("503")
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_breaker_lets_one_probe_through_when_half_open():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow()
+    assert breaker.state == "half-open"
+    assert not breaker.allow()  # the probe is still out
+
+
+def test_probe_outcome_closes_or_reopens_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0)
+    for _ in range(3):
+        breaker.record_failure()
+    breaker.allow()
+    breaker.record_failure()  # a failed probe reopens at once, below the threshold
+    assert breaker.state == "open"
+    breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_release_hands_an_unused_probe_back():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.state == "open"
+    assert breaker.allow()
+
+
+def test_release_leaves_a_closed_breaker_closed():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.release()
+    assert breaker.state == "closed"
+
+
+def test_bucket_refuses_a_wait_longer_than_max_wait_without_taking_a_token():
+    bucket = TokenBucket(rate=1, burst=1)
+    assert bucket.reserve() == 0
+    assert bucket.reserve(max_wait=0.1) is None
+    wait = bucket.reserve()
+    assert 0.9 < wait <= 1.0
+
+
+def test_open_breaker_fails_fast_without_taking_tokens():
+    up = upstream(rate=0.001, burst=1, failure_threshold=1)
+    up.breaker.record_failure()
+    with pytest.raises(UpstreamUnavailable, match="circuit open"):
+        up.call(lambda timeout: "ok")
+    assert up.stats["short_circuits"] == 1
+    assert up.bucket.reserve(max_wait=0) == 0  # the burst token is still there
+
+
+def test_throttled_probe_is_released_for_the_next_call():
+    up = upstream(rate=0.001, burst=1, failure_threshold=1, reset_timeout=0)
+    up.bucket.reserve()
+    up.breaker.record_failure()
+    with request_budget(1), pytest.raises(UpstreamUnavailable, match="rate limit"):
+        up.call(lambda timeout: "ok")
+    assert up.stats["throttled"] == 1
+    assert up.breaker.state == "open"
+    up.bucket = TokenBucket(rate=1000, burst=1000)
+    assert up.call(lambda timeout: "ok") == "ok"
+    assert up.breaker.state == "closed"
+
+
+def test_spent_budget_stops_calls_before_the_breaker_or_bucket():
+    up = upstream()
+    with request_budget(0.01):
+        time.sleep(0.02)
+        with pytest.raises(UpstreamUnavailable, match="budget spent"):
+            up.call(lambda timeout: "ok")
+    assert up.stats["calls"] == 0
+    assert up.breaker.state == "closed"
+
+
+def test_timeout_is_capped_by_the_remaining_budget():
+    up = upstream()
+    with request_budget(1):
+        timeout = up.call(lambda timeout: timeout)
+    assert 0 < timeout <= 1
+
+
+def test_retries_stop_at_max_retries_and_count_toward_the_breaker():
+    up = upstream(failure_threshold=2, max_retries=1)
+    with pytest.raises(UpstreamUnavailable, match="503"):
+        up.call(failing)
+    assert up.stats["retries"] == 1
+    assert up.stats["failures"] == 2
+    assert up.breaker.state == "open"
@@ -1,10 +1,10 @@
-import React, { useState } from 'react';
+import React, { useEffect, useState } from 'react';
 import { BrowserRouter as Router, Routes, Route, Link } from 'react-router-dom';
 import { Search, TrendingUp, DollarSign, BarChart3, PieChart, LineChart, Newspaper, Download, Loader2 } from 'lucide-react';
 import {
   BarChart, Bar, XAxis, YAxis, Tooltip, PieChart as RechartsPieChart, Pie, Cell, Legend, ResponsiveContainer, LineChart as RechartsLineChart, Line
 } from 'recharts';
-import { FinancialDigest } from './types/financial';
+import { FinancialDigest, SymbolCandidate } from './types/financial';
 import { MetricCard } from './components/MetricCard';
 import { ChartCard } from './components/ChartCard';
 import { formatCurrency, formatPercentage } from './utils/formatters';
@@ -18,27 +18,73 @@ function App() {
   const [digest, setDigest] = useState<FinancialDigest | null>(null);
   const [error, setError] = useState('');
   const [loading, setLoading] = useState(false);
+  const [suggestions, setSuggestions] = useState<SymbolCandidate[]>([]);
 
-  const handleSubmit = async () => {
-    if (!companyName.trim()) return;
+  // Autocomplete from the backend's local ticker index, a short pause after typing stops
+  useEffect(() => {
+    const query = companyName.trim();
+    if (!query) {
+      setSuggestions([]);
+      return;
+    }
+    const controller = new AbortController();
+    const timer = setTimeout(async () => {
+      try {
+        const response = await fetch(`http://localhost:5000/search?q=${encodeURIComponent(query)}`, { signal: controller.signal });
+        const data = await response.json();
+        setSuggestions(data.results ?? []);
+      } catch (err) {
+        // Aborted by the next keystroke or backend down; the Analyze button still works
+      }
+    }, 150);
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
+    };
+  }, [companyName]);
+
+  const handleSubmit = async (query: string = companyName) => {
+    if (!query.trim()) return;
     
+    setSuggestions([]);
     setError('');
     setDigest(null);
     setLoading(true);
 
     try {
-      const response = await fetch('http://localhost:5000/analyze', {
+      // The stream endpoint sends NDJSON: the numeric sections first, then each AI
+      // section as it is generated. Every line is a partial digest merged into state.
+      const response = await fetch('http://localhost:5000/analyze/stream', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ company: companyName })
+        body: JSON.stringify({ company: query })
       });
 
-      const data = await response.json();
-
-      if (!response.ok) {
+      if (!response.ok || !response.body) {
+        const data = await response.json();
         setError(data.error || 'Something went wrong');
-      } else {
-        setDigest(data);
+        return;
+      }
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop() ?? '';
+        for (const line of lines) {
+          if (!line.trim()) continue;
+          const section = JSON.parse(line);
+          if (section.error) {
+            setDigest(null);
+            setError(section.error);
+            return;
+          }
+          setDigest(prev => ({ ...(prev ?? {}), ...section } as FinancialDigest));
+        }
       }
     } catch (err) {
       setError('Backend not reachable. Is Flask running?');
@@ -90,9 +136,28 @@ function App() {
                   onKeyPress={handleKeyPress}
                   className="w-full pl-12 pr-4 py-4 border border-gray-300 rounded-xl text-lg focus:ring-2 focus:ring-blue-500 focus:border-transparent transition-all duration-200 bg-white/50 backdrop-blur-sm"
                 />
+                {suggestions.length > 0 && !loading && !suggestions.some(c => c.symbol === companyName) && (
+                  <ul className="absolute z-40 mt-2 w-full bg-white border border-gray-200 rounded-xl shadow-lg overflow-hidden">
+                    {suggestions.map((candidate) => (
+                      <li key={candidate.symbol}>
+                        <button
+                          type="button"
+                          onClick={() => {
+                            setCompanyName(candidate.symbol);
+                            handleSubmit(candidate.symbol);
+                          }}
+                          className="w-full px-4 py-3 text-left hover:bg-blue-50 flex items-center justify-between"
+                        >
+                          <span className="font-medium text-gray-900">{candidate.name}</span>
+                          <span className="text-sm text-gray-500">{candidate.symbol}{candidate.exchange ? ` · ${candidate.exchange}` : ''}</span>
+                        </button>
+                      </li>
+                    ))}
+                  </ul>
+                )}
               </div>
               <button 
-                onClick={handleSubmit}
+                onClick={() => handleSubmit()}
                 disabled={loading || !companyName.trim()}
                 className="px-8 py-4 bg-gradient-to-r from-blue-600 to-indigo-600 text-white font-semibold rounded-xl hover:from-blue-700 hover:to-indigo-700 disabled:opacity-50 disabled:cursor-not-allowed transition-all duration-200 flex items-center space-x-2 min-w-[140px] justify-center"
               >
@@ -11,7 +11,7 @@ const Home: React.FC<HomeProps> = ({ digest }) => {
   return (
     <div className="space-y-8">
       <h2 className="text-2xl font-bold mb-4">📊 Company Overview</h2>
-      <ChartCard title="Historical Revenue & Net Income (5 Years)">
+      <ChartCard title={`Historical Revenue & Net Income (${digest.historicalTrends?.years.length ?? 0} Years)`}>
         <ResponsiveContainer width="100%" height={300}>
           <RechartsLineChart data={digest.historicalTrends?.years.map((year, i) => ({
             year,
@@ -28,7 +28,7 @@ const Home: React.FC<HomeProps> = ({ digest }) => {
         </ResponsiveContainer>
       </ChartCard>
       <div className="mt-4 text-gray-700 text-base bg-blue-50 border-l-4 border-blue-400 px-4 py-3 rounded">
-        <strong>Summary:</strong> The chart above shows the company’s real revenue and net income trends over the past five years, helping you quickly spot growth or decline.
+        <strong>Summary:</strong> The chart above shows the company’s real revenue and net income trends over the years shown, helping you quickly spot growth or decline.
       </div>
     </div>
   );
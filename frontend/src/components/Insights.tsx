@@ -51,6 +51,9 @@ const Insights: React.FC<InsightsProps> = ({ digest }) => {
         <div className="bg-gradient-to-r from-blue-100 to-blue-50 border-l-8 border-blue-500 rounded-xl p-6 shadow">
           <h2 className="text-xl font-bold mb-2 text-blue-800">💡 Market Insights</h2>
           <ul className="text-gray-800 list-disc pl-6 space-y-3">
+            {!digest.marketInsights && (
+              <li className="leading-relaxed text-base text-gray-500 italic">Generating market insights...</li>
+            )}
             {digest.marketInsights && digest.marketInsights
               .replace(/\*\*/g, '')
               .split(/\n|\r|\*/)
@@ -159,7 +162,7 @@ const Insights: React.FC<InsightsProps> = ({ digest }) => {
         </div>
       )}
       {activeTab === 'cashflow' && digest.cashFlow && digest.cashFlow.years.length > 0 && (
-        <ChartCard title="💵 Cash Flow Trends (5 Years)">
+        <ChartCard title={`💵 Cash Flow Trends (${digest.cashFlow.years.length} Years)`}>
           <ResponsiveContainer width="100%" height={300}>
             <RechartsLineChart data={digest.cashFlow.years.map((year, i) => ({
               year,
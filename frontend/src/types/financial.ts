@@ -36,14 +36,19 @@ export interface FinancialDigest {
     years: string[];
     revenue: number[];
     netIncome: number[];
-    grossMargins: number[];
-    profitMargins: number[];
+    grossMargins: (number | null)[];
+    profitMargins: (number | null)[];
+    revenueGrowth?: (number | null)[];
+    netIncomeGrowth?: (number | null)[];
+    revenueCagr?: number | null;
   };
   cashFlow?: {
     years: string[];
     operating: number[];
     investing: number[];
     financing: number[];
+    freeCashFlow?: (number | null)[];
+    capexToOperating?: (number | null)[];
   };
   industryInsights?: {
     competitors: Array<{
@@ -55,6 +60,12 @@ export interface FinancialDigest {
       profitMargins: number;
       marketCap: number;
     }>;
+    peerCount?: number;
+    companyRank?: {
+      revenue: number | null;
+      profitMargins: number | null;
+      marketCap: number | null;
+    };
   };
   marketShare?: {
     company: number;
@@ -80,4 +91,11 @@ export interface MetricCardProps {
 export interface ChartCardProps {
   title: string;
   children: React.ReactNode;
-}
\ No newline at end of file
+}
+
+export interface SymbolCandidate {
+  symbol: string;
+  name: string;
+  exchange: string | null;
+  score: number;
+}